@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Usage: ./benchmarks/sqlite_queries.py [NB_RUNS...]
+
+Cost of the `BackendSqlite` read and rolling queries against the number of
+runs in the database, with and without the indexes of the schema migrations.
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from girl.store import BackendSqlite  # noqa: E402
+
+INDEXES = ("event_runs_id_ts", "event_runs_ts", "run_data_ts")
+HANDLERS = 10
+
+
+async def _fill(backend: BackendSqlite, nb: int):
+    conn = backend._conn
+    await conn.executemany(
+        r"INSERT INTO event_runs VALUES (?, ?, ?, ?, 1.0, 'ok', '{}')",
+        ((f"handler {k % HANDLERS}", f"run-{k}", float(k), "\t\t") for k in range(nb)),
+    )
+    await conn.executemany(
+        r"INSERT INTO run_data VALUES (?, ?, ?, ?, '')",
+        ((f"run-{k}", "*key*", float(k), b"hash") for k in range(nb)),
+    )
+    await conn.execute(r"INSERT INTO blobs VALUES (?, ?, ?, NULL)", (b"hash", nb, b""))
+    await conn.commit()
+
+
+async def _time(co: ..., repeat: int = 20) -> float:
+    start = perf_counter()
+    for _ in range(repeat):
+        await co()
+    return (perf_counter() - start) / repeat * 1000
+
+
+async def bench(nb: int, indexed: bool):
+    with TemporaryDirectory() as tmp:
+        backend = BackendSqlite(Path(tmp) / "bench.sqlite")
+        async with backend:
+            conn = backend._conn
+            if not indexed:
+                for name in INDEXES:
+                    await conn.execute(f"DROP INDEX {name}")
+            await _fill(backend, nb)
+
+            # the last 100 runs of one handler
+            listruns = lambda: backend.listruns(
+                "handler 0",
+                min_ts=nb - 100 * HANDLERS,
+                max_ts=nb,
+                any_tag=set(),
+            )
+
+            async def rolling_select():
+                c = await conn.execute(
+                    r"SELECT ts FROM event_runs ORDER BY ts DESC LIMIT 1 OFFSET 1000"
+                )
+                await c.fetchone()
+
+            async def rolling_delete():
+                await conn.execute(r"DELETE FROM run_data WHERE ts <= ?", (nb / 100,))
+                await conn.rollback()
+
+            return (
+                await _time(listruns),
+                await _time(rolling_select),
+                await _time(rolling_delete),
+            )
+
+
+async def main(sizes: list[int]):
+    print(
+        f"{'runs':>9} {'indexes':>8} {'listruns':>10} {'roll sel':>10} {'roll del':>10}"
+    )
+    for nb in sizes:
+        for indexed in (False, True):
+            r = await bench(nb, indexed)
+            ms = " ".join(f"{it:>8.3f}ms" for it in r)
+            print(f"{nb:>9} {'yes' if indexed else 'no':>8} {ms}")
+
+
+if "__main__" == __name__:
+    if {"-h", "--help"} & set(sys.argv[1:]):
+        exit(__doc__)
+    asyncio.run(main([int(n) for n in sys.argv[1:]] or [1_000, 10_000, 100_000]))
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""Usage: ./benchmarks/storerun_ids.py [NB_RUNS...]
+
+`BackendSqlite.storerun` throughput against the number of runs already in
+the database, with random runids (`coolname` slugs, as they used to be) and
+time-sorted ones (`runids.ulid`, the default); the last column is how many
+more pages the database takes with random ones (B-tree page splits).
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from time import time
+
+from coolname import generate_slug
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from girl.runids import ulid  # noqa: E402
+from girl.store import BackendSqlite  # noqa: E402
+from girl.store.base import RunInfoFull  # noqa: E402
+
+BATCH = 64
+MEASURED = 5_000
+
+
+def _runs(make: ..., nb: int):
+    for k in range(nb):
+        data = {"*request-body*": (0.0, f"body {k}".encode())}
+        yield make(), RunInfoFull(time(), "", set(), data)
+
+
+async def _store(backend: BackendSqlite, runs: ...):
+    batch = []
+    for runid, run in runs:
+        batch.append((f"handler {len(batch) % 10}", runid, run))
+        if BATCH <= len(batch):
+            await backend.storeruns(batch)
+            batch = []
+    if batch:
+        await backend.storeruns(batch)
+
+
+async def bench(nb: int, make: ...):
+    with TemporaryDirectory() as tmp:
+        backend = BackendSqlite(Path(tmp) / "bench.sqlite", synchronous="OFF")
+        async with backend:
+            await _store(backend, _runs(make, nb))
+
+            # (runids made beforehand, only the storing is timed)
+            runs = list(_runs(make, MEASURED))
+            start = perf_counter()
+            await _store(backend, runs)
+            took = perf_counter() - start
+
+            c = await backend._conn.execute(r"PRAGMA page_count")
+            (pages,) = await c.fetchone() or (0,)
+            return MEASURED / took, pages
+
+
+async def main(sizes: list[int]):
+    print(f"{'runs':>9} {'slugs':>12} {'ulids':>12} {'pages':>8}")
+    for nb in sizes:
+        slugs, slug_pages = await bench(nb, generate_slug)
+        ulids, ulid_pages = await bench(nb, ulid)
+        extra = slug_pages / ulid_pages - 1
+        print(f"{nb:>9} {slugs:>10.0f}/s {ulids:>10.0f}/s {extra:>+7.0%}")
+
+
+if "__main__" == __name__:
+    if {"-h", "--help"} & set(sys.argv[1:]):
+        exit(__doc__)
+    asyncio.run(main([int(n) for n in sys.argv[1:]] or [1_000, 10_000, 100_000]))
@@ -1,6 +1,7 @@
 from . import app
 from . import events
 from . import extra
+from . import runids
 from . import world
 from .app import App
 from .world import World
@@ -11,5 +12,6 @@ __all__ = (
     "app",
     "events",
     "extra",
+    "runids",
     "world",
 )
@@ -71,8 +71,22 @@ class _AppSettings_WorldWeb(TypedDict, total=False):
     middlewares: Sequence[aiohttp.ClientMiddlewareType]
 
 
+class _AppSettings_WorldWebPool(TypedDict, total=False):
+    # see `aiohttp.TCPConnector`
+    limit: int
+    limit_per_host: int
+    ttl_dns_cache: int | None
+    keepalive_timeout: float
+    # requested (HEAD) when the app is ready, so connections are already open
+    warmup: list[str]
+
+
 class _AppSettings(TypedDict, total=False):
     world_web: _AppSettings_WorldWeb
+    world_web_pool: _AppSettings_WorldWebPool
+    # makes the runid of each new run, by default `runids.ulid` (time-sorted)
+    runid: Callable[[], str]
+    # runids are random `coolname` slugs (as they used to be) if this is given
     slug_pattern: str | int
 
 
@@ -87,6 +101,10 @@ class App:
         self.web = EventsWeb(self)
         self._readies = set[Callable[[], Awaitable[None]]]()
         self.settings = app_settings or {}
+        # by settings, with the loop they belong to, see `_connector`
+        self._connectors = dict[
+            str, tuple[asyncio.AbstractEventLoop, aiohttp.TCPConnector]
+        ]()
 
     def summary(self) -> str:
         return self.cron.summary() + self.file.summary() + self.web.summary()
@@ -96,6 +114,51 @@ class App:
         self._readies.add(cb)
         return cb
 
+    def _connector(self):
+        """
+        connection pool (keep-alive, dns cache) shared by the `world.web` of
+        every run; each world still has its own session (cookies and all)
+
+        it belongs to the loop that first asks for it (the app's, see
+        `__call__`), None when on another one (eg. `procs.doevent` runs its
+        world on a loop of its own, in a thread)
+        """
+        se = self.settings.get("world_web") or {}
+        pool = self.settings.get("world_web_pool") or {}
+        key = repr((sorted(se.items()), sorted(pool.items())))
+        curr = asyncio.get_running_loop()
+        loop, conn = self._connectors.get(key) or (None, None)
+        if loop is None or conn is None or conn.closed or loop.is_closed():
+            ka = {k: v for k, v in pool.items() if "warmup" != k}
+            conn = aiohttp.TCPConnector(**ka)
+            self._connectors[key] = curr, conn
+        elif loop is not curr:
+            return None
+        return conn
+
+    def _session(self):
+        se = self.settings.get("world_web") or {}
+        if conn := self._connector():
+            return aiohttp.ClientSession(connector=conn, connector_owner=False, **se)
+        # not on the loop of the shared pool, a private one (closed with it)
+        pool = self.settings.get("world_web_pool") or {}
+        ka = {k: v for k, v in pool.items() if "warmup" != k}
+        return aiohttp.ClientSession(connector=aiohttp.TCPConnector(**ka), **se)
+
+    async def warmup(self, *urls: str):
+        """opens connections to these (dns, tcp, tls), for `world.web` to reuse"""
+        if not urls:
+            return
+        async with self._session() as sess:
+            r = await asyncio.gather(
+                *(sess.head(url) for url in urls), return_exceptions=True
+            )
+        for url, it in zip(urls, r):
+            if isinstance(it, BaseException):
+                _logger.warning(f"could not warm up {url!r}", exc_info=it)
+            else:
+                it.release()
+
     async def _status(self):
         try:
             with open("/proc/self/status") as st:
@@ -118,7 +181,11 @@ class App:
     async def __call__(self):
         """ """
         async with self.store, self.cron, self.file, self.web:
-            await asyncio.gather(*(cb() for cb in self._readies))
+            self._connector()  # (the shared pool is on this loop)
+            warmup = (self.settings.get("world_web_pool") or {}).get("warmup")
+            await asyncio.gather(
+                *(cb() for cb in self._readies), self.warmup(*warmup or ())
+            )
 
             await self.hook.start.trigger()
             _logger.info("Running")
@@ -137,6 +204,9 @@ class App:
             finally:
                 _logger.info("Stopping")
                 await self.hook.stop.trigger()
+                for _, conn in self._connectors.values():
+                    await conn.close()
+                self._connectors.clear()
 
     def run(self, *, debug: bool | None = None):
         try:
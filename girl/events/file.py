@@ -41,9 +41,11 @@ class Path(type(StdPath())):
         if self._world and self._world._pacifier and not self._world._pacifier.is_new:
             return self._world.app.store.load(self._world, str(self.resolve()))
 
-        data = super().read_bytes()
-        if self._world:
-            self._world.app.store.store(self._world, str(self.resolve()), data)
+        if not self._world:
+            return super().read_bytes()
+        with self._world.app.store.tracking(self._world, "read_bytes"):
+            data = super().read_bytes()
+        self._world.app.store.store(self._world, str(self.resolve()), data)
         return data
 
     def write_bytes(self, data: bytes):
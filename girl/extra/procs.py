@@ -4,6 +4,7 @@ import asyncio
 import sys
 from codeop import compile_command
 from collections.abc import Awaitable
+from dataclasses import asdict
 from datetime import datetime
 from fnmatch import fnmatchcase
 from functools import wraps
@@ -154,10 +155,17 @@ async def lsevents(
     min_ts: float | str | datetime = 0,
     max_ts: float | str | datetime = 10e10,
     any_tag: set[str] | list[str] | None = None,
+    limit: int | None = None,
+    after: str | None = None,
+    descending: bool = False,
     /,
     *,
     app: App,
 ):
+    """
+    at most `limit` runs across all the handlers, in (ts, runid) order;
+    `after` is "ts:runid" of the last run of the previous page, if any
+    """
     if isinstance(min_ts, str):
         min_ts = datetime.fromisoformat(min_ts)
     if isinstance(min_ts, datetime):
@@ -168,15 +176,37 @@ async def lsevents(
         max_ts = max_ts.timestamp()
     if max_ts <= min_ts:
         raise ValueError(f"broken timestamp range: {max_ts} <= {min_ts}")
-    return {
-        id: await app.store.listruns(
-            id,
-            min_ts=min_ts,
-            max_ts=max_ts,
-            any_tag={t.strip() for t in any_tag or () if t.strip()},
-        )
+    cursor = None
+    if after:
+        ts, _, runid = after.partition(":")
+        cursor = float(ts), runid
+
+    pages = {
+        id: [
+            run
+            async for run in app.store.iterruns(
+                id,
+                min_ts=min_ts,
+                max_ts=max_ts,
+                any_tag={t.strip() for t in any_tag or () if t.strip()},
+                after=cursor,
+                limit=limit,
+                descending=descending,
+            )
+        ]
         for id in await lshandlers(filt, app=app)
     }
+    # each handler gave its first `limit`, only keep the overall first `limit`
+    keys = sorted((run.ts, run.runid) for runs in pages.values() for run in runs)
+    if limit is not None and limit < len(keys):
+        if descending:
+            first = keys[-limit]
+            keep = lambda run: first <= (run.ts, run.runid)
+        else:
+            last = keys[limit - 1]
+            keep = lambda run: (run.ts, run.runid) <= last
+        pages = {id: [run for run in runs if keep(run)] for id, runs in pages.items()}
+    return pages
 
 
 @_proc
@@ -189,6 +219,89 @@ async def lstags(*, app: App):
     return await app.store.knowntags()
 
 
+@_proc
+async def lsmetrics(*, app: App):
+    return app.store.metrics()
+
+
+@_proc
+async def lsrollups(
+    filt: str = "all:*",
+    min_ts: float | str | datetime = 0,
+    max_ts: float | str | datetime = 10e10,
+    /,
+    *,
+    app: App,
+):
+    """per handler, counts of runs (bytes, keys, tags) by hour, or by day"""
+    if isinstance(min_ts, str):
+        min_ts = datetime.fromisoformat(min_ts)
+    if isinstance(min_ts, datetime):
+        min_ts = min_ts.timestamp()
+    if isinstance(max_ts, str):
+        max_ts = datetime.fromisoformat(max_ts)
+    if isinstance(max_ts, datetime):
+        max_ts = max_ts.timestamp()
+    return {
+        id: [
+            asdict(it)
+            for it in await app.store.rollups(id, min_ts=min_ts, max_ts=max_ts)
+        ]
+        for id in await lshandlers(filt, app=app)
+    }
+
+
+@_proc
+async def search(query: str, filt: str = "all:*", limit: int = 100, /, *, app: App):
+    """
+    runs whose recorded data mentions every word of `query`, with snippets;
+    `{"error": ...}` if the store has no full-text search
+    """
+    ids = await lshandlers(filt, app=app)
+    try:
+        hits = await app.store.search(query, ids=ids, limit=limit)
+    except NotImplementedError as e:
+        return {"error": f"search not enabled: {e}"}
+    return [asdict(it) for it in hits]
+
+
+@_proc
+async def exportruns(
+    path: str,
+    filt: str = "all:*",
+    min_ts: float | str | datetime = 0,
+    max_ts: float | str | datetime = 10e10,
+    any_tag: set[str] | list[str] | None = None,
+    /,
+    *,
+    app: App,
+):
+    """runs into an archive file (on the host of the app), see `importruns`"""
+    if isinstance(min_ts, str):
+        min_ts = datetime.fromisoformat(min_ts)
+    if isinstance(min_ts, datetime):
+        min_ts = min_ts.timestamp()
+    if isinstance(max_ts, str):
+        max_ts = datetime.fromisoformat(max_ts)
+    if isinstance(max_ts, datetime):
+        max_ts = max_ts.timestamp()
+    if max_ts <= min_ts:
+        raise ValueError(f"broken timestamp range: {max_ts} <= {min_ts}")
+    return await app.store.exportruns(
+        path,
+        await lshandlers(filt, app=app),
+        min_ts=min_ts,
+        max_ts=max_ts,
+        any_tag={t.strip() for t in any_tag or () if t.strip()},
+    )
+
+
+@_proc
+async def importruns(path: str, /, *, app: App):
+    """runs from an archive file made by `exportruns`, skips existing ones"""
+    return await app.store.importruns(path)
+
+
 class _RawPdb:
     def __init__(self, is_new: bool, io: Interact):
         self.is_new = is_new
@@ -8,6 +8,7 @@ from aiohttp import web
 
 from ...app import App
 from ...events.web import Request
+from ...runids import alias
 from ...world import World
 from .. import procs
 
@@ -53,6 +54,9 @@ class Webui:
         query_default_backrange: float = 60 * 60 * 24,
         # how many notifs will be at most put in the feed's list
         notif_limit: int = 500,
+        # run data bigger than this (in bytes, as stored) is not sent along
+        # with the run, but only fetched if asked for
+        data_inline_limit: int = 2**16,
         # renames title
         app_name: str = "app",
         favicon_path: str | PurePath | None = None,
@@ -61,6 +65,7 @@ class Webui:
         self._basic_auth_passwd = basic_auth_passwd
         self._query_default_backrange = query_default_backrange
         self._notif_limit = notif_limit
+        self._data_inline_limit = data_inline_limit
         self._app_name = app_name
         self._favicon_path = favicon_path and str(favicon_path)
 
@@ -70,6 +75,8 @@ class Webui:
         app.web.event(bind, "GET", f"{subpath}/-/api/events")(self._api_events)
         app.web.event(bind, "GET", f"{subpath}/-/api/data")(self._api_data)
         app.web.event(bind, "GET", f"{subpath}/-/api/tags")(self._api_tags)
+        app.web.event(bind, "GET", f"{subpath}/-/api/rollups")(self._api_rollups)
+        app.web.event(bind, "GET", f"{subpath}/-/api/search")(self._api_search)
         app.web.event(bind, "GET", f"{subpath}/-/notif")(notif)
 
     async def _serve(self, _world: World, req: Request):
@@ -109,11 +116,31 @@ class Webui:
         except:
             pass
         any_tag = req.rel_url.query.getall("any_tag", None)
-        l = await procs.lsevents(filter, min_ts, max_ts, any_tag, app=world.app)
+        # pages of `limit` runs (in "asc" or "desc" order), see `lsevents`
+        limit = req.rel_url.query.get("limit")
+        after = req.rel_url.query.get("after")
+        desc = "desc" == req.rel_url.query.get("order")
+        l = await procs.lsevents(
+            filter,
+            min_ts,
+            max_ts,
+            any_tag,
+            None if limit is None else int(limit),
+            after,
+            desc,
+            app=world.app,
+        )
         return req.respond(
             json={
                 id: [
-                    {"ts": run.ts, "runid": run.runid, "tags": sorted(run.tags)}
+                    {
+                        "ts": run.ts,
+                        "runid": run.runid,
+                        "alias": alias(run.runid),
+                        "tags": sorted(run.tags),
+                        "duration": run.duration,
+                        "outcome": run.outcome,
+                    }
                     for run in runs
                 ]
                 for id, runs in l.items()
@@ -133,26 +160,67 @@ class Webui:
                 return req.respond(status=403)
 
         runid = req.rel_url.query["runid"]
-        run = await procs.lsdata(runid, app=world.app)
+        store = world.app.store
+        run = await store.loadrunlazy(runid)
+
+        if (key := req.rel_url.query.get("key")) is not None:
+            if key not in run.sizes:
+                return req.respond(status=404)
+            # already a file as is (eg. a sidecar): sent by the kernel (sendfile)
+            if not run.codecs.get(key) and (path := run.reader.path(key)):
+                return web.FileResponse(
+                    path, headers={"Content-Type": "application/octet-stream"}
+                )
+            # a single entry: streamed through as is, never all in memory
+            assert req._req, "not a real request? (crafted or replayed?)"
+            res = web.StreamResponse(
+                headers={"Content-Type": "application/octet-stream"}
+            )
+            await res.prepare(req._req)
+            async for chunk in store.streamdata(run, key):
+                await res.write(chunk)
+            await res.write_eof()
+            return res
+
+        # 1. bytes cannot be json serialized: decode+backslash non utf8,
+        # 2. python dict keep order but receiving end may not: use a list
+        # 3. data too big is left out, to be fetched on its own with `&key=`
+        data = list[dict[str, object]]()
+        for key, (ts, size) in run.sizes.items():
+            entry = dict[str, object](key=key, ts=ts, size=size)
+            if size <= self._data_inline_limit and not run.reader.path(key):
+                # this will be transmitting secrets! there could be a way
+                # to hook in and filter data to blank out anything that should
+                raw = await store.loaddata(run, key)
+                entry["data"] = raw.decode(errors="backslashreplace")
+            data.append(entry)
+
         return req.respond(
             json={
                 "ts": run.ts,
                 "runid": run.runid,
                 "tags": sorted(run.tags),
-                # 1. bytes cannot be json serialized: decode+backslash non utf8,
-                # 2. python dict keep order but receiving end may not: use a list
-                "data": [
-                    {
-                        "key": key,
-                        "ts": ts,
-                        # this will be transmitting secrets! there could be a way
-                        # to hook in and filter data to blank out anything that should
-                        "data": data.decode(errors="backslashreplace"),
-                    }
-                    for key, (ts, data) in run.data.items()
-                ],
+                "data": data,
             }
         )
 
     async def _api_tags(self, world: World, req: Request):
         return req.respond(json=sorted(await procs.lstags(app=world.app)))
+
+    async def _api_rollups(self, world: World, req: Request):
+        filter = req.rel_url.query.get("filter", "all:*")
+        min_ts = float(req.rel_url.query.get("min_ts", "0"))
+        max_ts = float(req.rel_url.query.get("max_ts", "10e10"))
+        l = await procs.lsrollups(filter, min_ts, max_ts, app=world.app)
+        return req.respond(json=l)
+
+    async def _api_search(self, world: World, req: Request):
+        query = req.rel_url.query.get("q", "")
+        filter = req.rel_url.query.get("filter", "all:*")
+        limit = int(req.rel_url.query.get("limit", "100"))
+        if not query.strip():
+            return req.respond(json=[])
+        l = await procs.search(query, filter, limit, app=world.app)
+        if isinstance(l, dict):
+            return req.respond(status=501, json=l)
+        return req.respond(json=l)
@@ -38,7 +38,7 @@
     }
     cacheFetchJSON.cache = new Map;
 
-    /** @typedef {{id: string, runid: str, date: Date, tags: string[]}} Notif */
+    /** @typedef {{id: string, runid: str, ts: number, date: Date, tags: string[]}} Notif */
 
     class NotifListCE extends HTMLElement {
         static tag = 'notif-list';
@@ -69,7 +69,7 @@
             this.socket.onmessage = e => hold_notifs_until_old_fetched.push(JSON.parse(e.data));
 
             const now = Date.now() / 1000;
-            fetch(`-/api/events?min_ts=${now - QUERY_DEFAULT_BACKRANGE}&max_ts=${now}`)
+            fetch(`-/api/events?min_ts=${now - QUERY_DEFAULT_BACKRANGE}&max_ts=${now}&limit=${NOTIF_LIMIT}&order=desc`)
                 .then(r => r.json())
                 .then(/** @param {{[id: string]: any[]}} r */ r => {
                     const push = this.pushNotif.bind(this);
@@ -88,6 +88,10 @@
                     it.style.display = this._activeFilter(it.notif) ? '' : 'none';
             };
             this.force_search.onclick = this.forceSearch.bind(this);
+            this.list.onscroll = _ => {
+                if (this.list.scrollHeight - this.list.clientHeight - 64 < this.list.scrollTop)
+                    this.loadOlder();
+            };
         }
 
         _attempts = 0;
@@ -116,17 +120,48 @@
             ) && notif.tags.every(t => !this.tags.current_tags.has('-' + t)); // AND none of the tag is present negatively
         }
 
-        pushNotif({ id, runid, ts, tags }) {
+        _makeNotif({ id, runid, ts, tags }) {
             this.tags.updateAllTags(tags);
             /** @type {NotifListItemCE} */
             const it = document.createElement(NotifListItemCE.tag);
-            it.setNotif({ id, runid, date: new Date(ts * 1000), tags });
+            it.setNotif({ id, runid, ts, date: new Date(ts * 1000), tags });
             it.style.display = this._activeFilter(it.notif) ? '' : 'none';
-            this.list.prepend(it);
+            return it;
+        }
+
+        pushNotif(notif) {
+            this.list.prepend(this._makeNotif(notif));
             if (NOTIF_LIMIT < this.list.childElementCount)
                 this.list.lastElementChild.remove();
         }
 
+        _loading_older = false;
+        _no_more_older = false;
+        /** infinite scroll: next page of runs from before the last one in the list */
+        loadOlder() {
+            /** @type {NotifListItemCE} */
+            const oldest = this.list.lastElementChild;
+            if (!oldest || this._loading_older || this._no_more_older) return;
+            this._loading_older = true;
+
+            const url = new URL(`${location.origin}${SUBPATH}/-/api/events`);
+            url.searchParams.append('order', 'desc');
+            url.searchParams.append('limit', 100);
+            url.searchParams.append('after', `${oldest.notif.ts}:${oldest.notif.runid}`);
+
+            fetch(url)
+                .then(r => r.json())
+                .then(/** @param {{[id: string]: any[]}} r */ r => {
+                    const older = Object
+                        .entries(r)
+                        .flatMap(([id, runs]) => runs.map(run => ({ id, ...run })))
+                        .sort((a, b) => b.ts - a.ts);
+                    this._no_more_older = !older.length;
+                    for (const notif of older) this.list.append(this._makeNotif(notif));
+                })
+                .finally(() => this._loading_older = false);
+        }
+
         forceSearch() {
             const url = new URL(`${location.origin}${SUBPATH}/-/api/events`);
             const now = Date.now() / 1000;
@@ -327,15 +362,27 @@
                 `${SUBPATH}/-/api/data?runid=${this.source.notif.runid}`,
                 { headers: { 'Authorization': `Basic ${passwordRequired()}` } })
                 .then(({ data }) => data
-                    .forEach(({ key, ts, data }) => {
+                    .forEach(({ key, ts, size, data }) => {
                         const details = this.data.appendChild(document.createElement('details'));
-                        try { data = JSON.stringify(JSON.parse(data), null, 4); } catch { }
                         details
                             .appendChild(document.createElement('summary'))
                             .textContent = `${new Date(ts * 1000).toLocaleString()}: ${key}`;
-                        details
-                            .appendChild(document.createElement('pre'))
-                            .textContent = data;
+                        const pre = details.appendChild(document.createElement('pre'));
+                        const show = data => {
+                            try { data = JSON.stringify(JSON.parse(data), null, 4); } catch { }
+                            pre.textContent = data;
+                        };
+                        if (undefined !== data) return void show(data);
+                        // too big to have been sent along, fetch only when opened
+                        details.ontoggle = _ => {
+                            details.ontoggle = null;
+                            pre.textContent = `(${size} bytes...)`;
+                            fetch(
+                                `${SUBPATH}/-/api/data?runid=${this.source.notif.runid}&key=${encodeURIComponent(key)}`,
+                                { headers: { 'Authorization': `Basic ${passwordRequired()}` } })
+                                .then(r => r.text())
+                                .then(show);
+                        };
                     }))
                 .catch(err => {
                     passwordRequired._credentials = null;
@@ -0,0 +1,72 @@
+"""Run ids, see the `runid` app setting."""
+
+import os
+from random import Random
+from threading import Lock
+from time import time_ns
+
+from coolname import RandomGenerator
+
+# crockford's base32 (no I, L, O, U), in ascii order so ids sort as strings
+_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_RANDOM_BITS = 80
+
+
+class Ulid:
+    """
+    ULID-like ids: 48 bits of milliseconds since epoch then 80 bits started
+    at random each millisecond and incremented for each id within the same
+    one; 26 characters, that sort as they were made (even if the clock goes
+    back) and do not collide across processes
+
+    this keeps new runs at the end of the (runid) primary keys of the
+    backends rather than all over them
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._ms = 0
+        self._rand = 0
+
+    def __call__(self) -> str:
+        with self._lock:
+            ms = time_ns() // 1_000_000
+            if self._ms < ms:
+                self._rand = int.from_bytes(os.urandom(_RANDOM_BITS // 8))
+            else:
+                ms = self._ms
+                self._rand += 1
+                if self._rand >> _RANDOM_BITS:
+                    # (wrapped around within the same millisecond, borrow one)
+                    ms += 1
+                    self._rand = int.from_bytes(os.urandom(_RANDOM_BITS // 8))
+            self._ms = ms
+            n = ms << _RANDOM_BITS | self._rand
+        return "".join(_ALPHABET[n >> shift & 31] for shift in range(125, -1, -5))
+
+
+ulid = Ulid()
+
+
+def timestamp(runid: str) -> float | None:
+    """when a `ulid` runid was made (in seconds), None if it is not one"""
+    if 26 != len(runid) or not set(runid) <= set(_ALPHABET):
+        return None
+    n = 0
+    for c in runid[:10]:
+        n = n << 5 | _ALPHABET.index(c)
+    return n / 1000
+
+
+_aliases: RandomGenerator | None = None
+
+
+def alias(runid: str) -> str:
+    """human friendly name (eg. "winged-dragon") for display, always the same"""
+    global _aliases
+    if _aliases is None:
+        from coolname.data import config  # (only loaded when needed)
+
+        _aliases = RandomGenerator(config)
+    _aliases.random = Random(runid)
+    return _aliases.generate_slug(2)
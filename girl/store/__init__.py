@@ -1,9 +1,13 @@
 from .base import Store
 from .memory import BackendMemory
+from .partitioned import BackendSqlitePartitioned
+from .segments import BackendSegments
 from .sqlite import BackendSqlite
 
 __all__ = (
     "Store",
     "BackendMemory",
+    "BackendSegments",
     "BackendSqlite",
+    "BackendSqlitePartitioned",
 )
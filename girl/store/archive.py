@@ -0,0 +1,139 @@
+import json
+import struct
+import zlib
+from collections.abc import Iterator
+from pathlib import Path
+from typing import TYPE_CHECKING
+from typing import Any
+from typing import BinaryIO
+
+if TYPE_CHECKING:
+    from .base import RunInfoLazy
+
+_MAGIC = b"girlarc\x01"
+# length once compressed, length of the raw bytes; followed by the zlib'd bytes
+_FRAME = struct.Struct("<II")
+# length of the json header of a run; followed by the header then the data of
+# every key back to back, in the order of the header
+_RUN = struct.Struct("<I")
+
+
+class _ArchiveWriter:
+    """
+    blocking, runs one after the other in a stream that is compressed by
+    chunks (frames) of `chunk_size`; neither writing nor reading holds more
+    than a chunk (and a run when reading) in memory
+    """
+
+    __slots__ = ("chunk_size", "runs", "_file", "_buf")
+
+    def __init__(self, path: Path, chunk_size: int = 2**20):
+        self.chunk_size = chunk_size
+        self.runs = 0
+        self._file: BinaryIO = path.open("wb")
+        self._file.write(_MAGIC)
+        self._buf = bytearray()
+
+    def _write(self, data: bytes):
+        self._buf += data
+        while self.chunk_size <= len(self._buf):
+            self._frame(self._buf[: self.chunk_size])
+            del self._buf[: self.chunk_size]
+
+    def _frame(self, raw: bytes | bytearray):
+        it = zlib.compress(raw)
+        self._file.write(_FRAME.pack(len(it), len(raw)))
+        self._file.write(it)
+
+    def writerun(self, id: str, run: "RunInfoLazy"):
+        """its data is as stored (so maybe encoded), see `RunInfoLazy.codecs`"""
+        keys = [
+            (key, ts, run.codecs.get(key, ""), size)
+            for key, (ts, size) in run.sizes.items()
+        ]
+        head = json.dumps(
+            {"id": id, "runid": run.runid, "ts": run.ts, "tags": sorted(run.tags)}
+            | {"meta": run.meta(), "keys": keys}
+        ).encode()
+        self._write(_RUN.pack(len(head)))
+        self._write(head)
+        for key, *_ in keys:
+            for chunk in run.reader.chunks(key, self.chunk_size):
+                self._write(chunk)
+        self.runs += 1
+
+    def close(self):
+        if self._buf:
+            self._frame(self._buf)
+            self._buf.clear()
+        self._file.close()
+
+
+class _ArchiveReader:
+    """blocking, see `_ArchiveWriter`"""
+
+    __slots__ = ("path", "_file", "_buf")
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._file: BinaryIO = path.open("rb")
+        if _MAGIC != self._file.read(len(_MAGIC)):
+            self._file.close()
+            raise ValueError(f"not an archive of runs: {path}")
+        self._buf = bytearray()
+
+    def _fill(self, n: int):
+        while len(self._buf) < n:
+            head = self._file.read(_FRAME.size)
+            if not head:
+                return False
+            if len(head) < _FRAME.size:
+                raise ValueError(f"truncated archive: {self.path}")
+            clen, rlen = _FRAME.unpack(head)
+            try:
+                raw = zlib.decompress(self._file.read(clen))
+            except zlib.error as e:
+                raise ValueError(f"corrupted archive: {self.path}") from e
+            if len(raw) != rlen:
+                raise ValueError(f"corrupted archive: {self.path}")
+            self._buf += raw
+        return True
+
+    def _read(self, n: int) -> bytes:
+        if not self._fill(n):
+            raise ValueError(f"truncated archive: {self.path}")
+        r = bytes(self._buf[:n])
+        del self._buf[:n]
+        return r
+
+    def readrun(self) -> tuple[str, dict[str, Any]] | None:
+        """
+        next run (its handler id and the fields of a `RunInfoFull`), None at
+        the end
+        """
+        if not self._buf and not self._fill(1):
+            return None
+        (hlen,) = _RUN.unpack(self._read(_RUN.size))
+        head = json.loads(self._read(hlen))
+        data = dict[str, tuple[float, bytes]]()
+        codecs = dict[str, str]()
+        for key, ts, codec, size in head["keys"]:
+            data[key] = ts, self._read(size)
+            if codec:
+                codecs[key] = codec
+        run = {
+            "ts": head["ts"],
+            "runid": head["runid"],
+            "tags": set(head["tags"]),
+            "data": data,
+            "codecs": codecs,
+            **head["meta"],
+        }
+        return head["id"], run
+
+    def __iter__(self) -> Iterator[tuple[str, dict[str, Any]]]:
+        while it := self.readrun():
+            yield it
+
+    def close(self):
+        self._file.close()
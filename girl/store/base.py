@@ -1,17 +1,36 @@
+import asyncio
+import zlib
 from abc import ABC
 from abc import abstractmethod
+from bisect import bisect_left
+from collections import OrderedDict
+from collections.abc import AsyncGenerator
+from collections.abc import AsyncIterator
 from collections.abc import Callable
+from collections.abc import Iterable
+from collections.abc import Iterator
+from contextlib import contextmanager
 from dataclasses import dataclass
+from dataclasses import field
+from dataclasses import replace
+from fnmatch import fnmatchcase
 from logging import getLogger
+from pathlib import Path
+from time import perf_counter
 from time import time
 from types import TracebackType
+from typing import Literal
 
 from ..world import World
+from .archive import _ArchiveReader
+from .archive import _ArchiveWriter
+from .journal import _Journal
 
 _logger = getLogger(__name__)
 
 _CompressFunc = Callable[[bytes], bytes]
 _DecompressFunc = Callable[[bytes], bytes]
+_Codec = tuple[_CompressFunc, _DecompressFunc]
 
 
 @dataclass(frozen=True, slots=True)
@@ -19,24 +38,243 @@ class RunInfoPartial:
     ts: float
     runid: str
     tags: set[str]
+    # (in seconds) unknown for runs from before these were recorded
+    duration: float | None = field(default=None, kw_only=True)
+    # "ok", or the name of the exception the run ended with
+    outcome: str | None = field(default=None, kw_only=True)
+    # time spent in tracked operations, see `Store.tracking`
+    timings: dict[str, float] = field(default_factory=dict, kw_only=True)
+
+    def meta(self):
+        """as keyword arguments, for making another `RunInfo*` of this run"""
+        return {
+            "duration": self.duration,
+            "outcome": self.outcome,
+            "timings": self.timings,
+        }
+
+    @property
+    def failed(self):
+        return self.outcome is not None and "ok" != self.outcome
 
 
 @dataclass(frozen=True, slots=True)
 class RunInfoFull(RunInfoPartial):
     data: dict[str, tuple[float, bytes]]
+    # name of the codec `data[key]` is encoded with, for keys that are
+    # (see `Store.codecs`); backends must keep it along with the data
+    codecs: dict[str, str] = field(default_factory=dict)
+
+
+@dataclass(frozen=True, slots=True)
+class SearchHit:
+    id: str
+    runid: str
+    ts: float
+    key: str
+    # around the match, which is [between brackets]
+    snippet: str
+
+
+# runs are counted by the hour, see `Rollup`
+ROLLUP_WIDTH = 3600.0
+
+
+@dataclass(slots=True)
+class Rollup:
+    """aggregates of the runs of a handler that started in [ts, ts+width)"""
+
+    ts: float
+    width: float = ROLLUP_WIDTH
+    runs: int = 0
+    # as stored
+    bytes: int = 0
+    keys: int = 0
+    # nb of runs with each tag
+    tags: dict[str, int] = field(default_factory=dict)
+
+    def add(self, size: int, keys: int, tags: Iterable[str], runs: int = 1):
+        self.runs += runs
+        self.bytes += size
+        self.keys += keys
+        for tag in tags:
+            self.tags[tag] = self.tags.get(tag, 0) + runs
+
+    def merge(self, other: "Rollup"):
+        self.add(other.bytes, other.keys, (), other.runs)
+        for tag, n in other.tags.items():
+            self.tags[tag] = self.tags.get(tag, 0) + n
+
+
+# per handler, by bucket ts; for the backends that keep them in memory
+_Rollups = dict[str, dict[float, Rollup]]
+
+
+def _rollup(
+    rollups: _Rollups, id: str, ts: float, size: int, keys: int, tags: Iterable[str]
+):
+    """adds a run to its bucket, True if the bucket is a new one"""
+    buckets = rollups.setdefault(id, {})
+    bucket = ts // ROLLUP_WIDTH * ROLLUP_WIDTH
+    new = bucket not in buckets
+    buckets.setdefault(bucket, Rollup(bucket)).add(size, keys, tags)
+    return new
+
+
+def _rollups_between(rollups: _Rollups, id: str, min_ts: float, max_ts: float):
+    return [
+        Rollup(it.ts, it.width, it.runs, it.bytes, it.keys, it.tags.copy())
+        for _, it in sorted(rollups.get(id, {}).items())
+        if min_ts < it.ts + it.width and it.ts <= max_ts
+    ]
+
+
+class DataReader(ABC):
+    """fetches the (stored, so maybe encoded) data of a run, key by key"""
+
+    @abstractmethod
+    def read(self, key: str) -> bytes:
+        """blocking"""
+
+    @abstractmethod
+    def chunks(self, key: str, size: int) -> Iterator[bytes]:
+        """blocking, between each chunk"""
+
+    async def aread(self, key: str) -> bytes:
+        return await asyncio.to_thread(self.read, key)
+
+    def path(self, key: str) -> Path | None:
+        """a file of exactly the (stored) data, if there is one"""
+        return None
+
+
+class _DictReader(DataReader):
+    __slots__ = ("_data",)
+
+    def __init__(self, data: dict[str, tuple[float, bytes]]):
+        self._data = data
+
+    def read(self, key: str):
+        return self._data[key][1]
+
+    def chunks(self, key: str, size: int):
+        view = memoryview(self._data[key][1])
+        return (bytes(view[k : k + size]) for k in range(0, len(view), size))
+
+    async def aread(self, key: str):
+        return self.read(key)
+
+
+@dataclass(frozen=True, slots=True)
+class RunInfoLazy(RunInfoPartial):
+    # ts and size (as stored) of each key, in ts order; the data
+    # itself is only fetched through `reader` when needed
+    sizes: dict[str, tuple[float, int]]
+    codecs: dict[str, str]
+    reader: DataReader
+
+
+class _KeyIndex:
+    """
+    occurrences of each key in a run; repeated keys are stored as "key",
+    "key (0)", "key (1)", ...; `next` gives the name of the next one in O(1)
+    (when storing that's the next free name, when loading a replay cursor)
+    """
+
+    __slots__ = ("_counts",)
+
+    def __init__(self):
+        self._counts = dict[str, int]()
+
+    @staticmethod
+    def nth(key: str, n: int) -> str:
+        return key if 0 == n else f"{key} ({n - 1})"
+
+    def next(self, key: str) -> str:
+        n = self._counts.get(key, 0)
+        self._counts[key] = n + 1
+        return _KeyIndex.nth(key, n)
+
+
+class _Histogram:
+    """counts of values by bucket, each bucket up to (and with) its bound"""
+
+    __slots__ = ("bounds", "counts", "total", "max")
+
+    # in seconds, 1ms to ~1min
+    LATENCY = tuple(2**k / 1000 for k in range(17))
+    # in bytes, 1B to 1GiB
+    SIZE = tuple(4**k for k in range(16))
+
+    def __init__(self, bounds: tuple[float, ...] = LATENCY):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def asdict(self) -> dict[str, object]:
+        bounds = [f"{b:g}" for b in self.bounds] + ["inf"]
+        return {
+            "count": sum(self.counts),
+            "total": self.total,
+            "max": self.max,
+            "buckets": {b: n for b, n in zip(bounds, self.counts) if n},
+        }
+
+
+_Durability = Literal["enqueue", "commit"]
+_Waiter = asyncio.Future[None] | None
+_Pending = tuple[World, RunInfoFull, _Waiter]
 
 
 class Base(ABC):
     """ """
 
+    # set by whoever keeps things about runs in front of the backend (see
+    # `Store`), to know when they are removed (retention)
+    _forgetting: Callable[[list[str]], None] | None = None
+
+    def _forgot(self, runids: list[str]):
+        """backends call this with the runids they removed"""
+        if self._forgetting and runids:
+            self._forgetting(runids)
+
+    def metrics(self) -> dict[str, object]:
+        """backend specific, see `Store.metrics`"""
+        return {}
+
     @abstractmethod
     async def storerun(self, id: str, runid: str, run: RunInfoFull):
         """ """
 
+    async def storeruns(self, batch: list[tuple[str, str, RunInfoFull]]):
+        """(id, runid, run) for each; in a single transaction if supported"""
+        for id, runid, run in batch:
+            await self.storerun(id, runid, run)
+
     @abstractmethod
     async def loadrun(self, runid: str) -> RunInfoFull:
         """ """
 
+    async def loadrunlazy(self, runid: str) -> RunInfoLazy:
+        """default is to `loadrun` everything, backends should do better"""
+        run = await self.loadrun(runid)
+        sizes = {key: (ts, len(data)) for key, (ts, data) in run.data.items()}
+        return RunInfoLazy(
+            run.ts,
+            runid,
+            run.tags,
+            sizes,
+            run.codecs,
+            _DictReader(run.data),
+            **run.meta(),
+        )
+
     @abstractmethod
     async def listruns(
         self,
@@ -45,13 +283,67 @@ class Base(ABC):
         min_ts: float,
         max_ts: float,
         any_tag: set[str],
+        min_duration: float | None = None,
+        failed_only: bool = False,
     ) -> list[RunInfoPartial]:
         """ """
 
+    @abstractmethod
+    def iterruns(
+        self,
+        id: str,
+        *,
+        min_ts: float,
+        max_ts: float,
+        any_tag: set[str],
+        after: tuple[float, str] | None = None,
+        limit: int | None = None,
+        descending: bool = False,
+    ) -> AsyncIterator[RunInfoPartial]:
+        """
+        like `listruns` but in pages, ordered by (ts, runid); `after` is a
+        (ts, runid) cursor, excluded, usually the last one seen
+        """
+
     @abstractmethod
     async def knowntags(self) -> set[str]:
         """ """
 
+    async def rollups(
+        self,
+        id: str,
+        *,
+        min_ts: float,
+        max_ts: float,
+    ) -> list[Rollup]:
+        """
+        buckets overlapping [min_ts, max_ts], in ts order; the default goes
+        through every run, backends should keep them up to date instead
+        """
+        buckets = dict[float, Rollup]()
+        # whole buckets
+        first = min_ts // ROLLUP_WIDTH * ROLLUP_WIDTH
+        last = max_ts // ROLLUP_WIDTH * ROLLUP_WIDTH
+        runs = await self.listruns(
+            id, min_ts=first, max_ts=last + ROLLUP_WIDTH, any_tag=set()
+        )
+        for it in runs:
+            run = await self.loadrunlazy(it.runid)
+            ts = run.ts // ROLLUP_WIDTH * ROLLUP_WIDTH
+            size = sum(size for _, size in run.sizes.values())
+            buckets.setdefault(ts, Rollup(ts)).add(size, len(run.sizes), run.tags)
+        return [buckets[ts] for ts in sorted(buckets) if ts <= last]
+
+    async def search(
+        self,
+        query: str,
+        *,
+        ids: list[str] | None = None,
+        limit: int = 100,
+    ) -> list[SearchHit]:
+        """full-text, `query` is sqlite's FTS5 syntax; best matches first"""
+        raise NotImplementedError(f"{type(self).__name__} has no full-text search")
+
     @abstractmethod
     async def status(self) -> str:
         """ """
@@ -80,25 +372,248 @@ class Store:
         *,
         compress: _CompressFunc | None = None,
         decompress: _DecompressFunc | None = None,
+        # known codecs by name, in addition to "zlib"
+        codecs: dict[str, _Codec] | None = None,
+        # which codec (by name, "" is none) encodes which key: the first
+        # fnmatch pattern that matches wins, eg.
+        # `[("*.gz", ""), ("*request-body*", "zlib")]`
+        codec_for: list[tuple[str, str]] | None = None,
+        # data smaller than this (in bytes) is never encoded
+        codec_min_size: int = 256,
+        # when set, finished runs are put in a queue of at most this many and
+        # flushed to the backend by a background task (write-behind); a full
+        # queue makes `finishrun` wait (backpressure)
+        write_behind: int | None = None,
+        # with write-behind, `finishrun` returns as soon as the run is queued
+        # ("enqueue") or only once the backend stored it ("commit")
+        durability: _Durability = "commit",
+        # keep up to this many bytes of recently loaded (decoded) runs
+        cache_size: int | None = None,
+        # runs recording more than `spill_size` bytes have everything written
+        # to a journal file in this directory instead of being kept in memory;
+        # the journal is read back when the run finishes, and journals left
+        # over (crash) are stored as is, tagged "recovered", at start
+        spill_dir: str | Path | None = None,
+        spill_size: int = 2**24,
+        spill_recover: bool = True,
+        # when replaying, keys up to this size (as stored) are fetched and
+        # decoded up front in a thread, larger ones only as they are loaded
+        replay_prefetch_size: int = 2**20,
     ):
         self._backend = backend
-        self._ongoing = dict[tuple[str, str], RunInfoFull]()
+        # runs being recorded, or being replayed (then lazy)
+        self._ongoing = dict[tuple[str, str], RunInfoFull | RunInfoLazy]()
+        self._keyindex = dict[tuple[str, str], _KeyIndex]()
+        # decoded data of the runs being replayed, see `replay_prefetch_size`
+        self._prefetched = dict[tuple[str, str], dict[str, bytes]]()
+        self.replay_prefetch_size = replay_prefetch_size
         self.compress = compress
         self.decompress = decompress
 
+        self.codecs = {"zlib": (zlib.compress, zlib.decompress), **(codecs or {})}
+        self.codec_for = list(codec_for or ())
+        self.codec_min_size = codec_min_size
+        if compress and decompress:
+            self.codecs["custom"] = compress, decompress
+            self.codec_for.append(("*", "custom"))
+
+        self.write_behind = write_behind
+        self.durability = durability
+        self._pending = asyncio.Queue[_Pending](write_behind or 0)
+        self._flusher: asyncio.Task[None] | None = None
+
+        # runs are never modified once stored, only ever removed
+        self.cache_size = cache_size
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._cache = OrderedDict[str, tuple[int, RunInfoFull]]()
+        self._cache_bytes = 0
+        backend._forgetting = self._uncache
+
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        self.spill_size = spill_size
+        self.spill_recover = spill_recover
+        # bytes in memory of each run being recorded, until it is spilled
+        self._inmemory = dict[tuple[str, str], int]()
+        self._journals = dict[tuple[str, str], _Journal]()
+        # see `tracking`
+        self._optimes = dict[tuple[str, str], dict[str, float]]()
+
+        # see `metrics`
+        self._timings = dict[str, _Histogram]()
+        self._runsizes = _Histogram(_Histogram.SIZE)
+        # per handler, nb of runs and bytes
+        self._written = dict[str, list[int]]()
+
+    @contextmanager
+    def _timing(self, op: str):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            took = perf_counter() - start
+            self._timings.setdefault(op, _Histogram()).add(took)
+
+    def _codec(self, key: str, data: bytes) -> str:
+        if len(data) < self.codec_min_size:
+            return ""
+        return next((c for pat, c in self.codec_for if fnmatchcase(key, pat)), "")
+
+    def _encode(self, run: RunInfoFull) -> RunInfoFull:
+        data = dict[str, tuple[float, bytes]]()
+        codecs = dict[str, str]()
+        for key, (ts, it) in run.data.items():
+            if codec := self._codec(key, it):
+                it = self.codecs[codec][0](it)
+                codecs[key] = codec
+            data[key] = ts, it
+        return replace(run, data=data, codecs=codecs)
+
+    def _decode(self, run: RunInfoFull) -> RunInfoFull:
+        data = run.data.copy()
+        for key, codec in run.codecs.items():
+            if codec not in self.codecs:
+                raise LookupError(
+                    f"unknown codec {codec!r} for {key!r} in {run.runid!r}"
+                )
+            ts, it = data[key]
+            data[key] = ts, self.codecs[codec][1](it)
+        return replace(run, data=data, codecs={})
+
     async def _storerun(self, id: str, runid: str, run: RunInfoFull):
-        if cf := self.compress:
-            for key, (ts, data) in run.data.items():
-                run.data[key] = ts, cf(data)
-        await self._backend.storerun(id, runid, run)
+        # encoding is done off the event loop
+        if self.codec_for:
+            run = await asyncio.to_thread(self._encode, run)
+        if run.duration is not None:
+            # from the end of the run until it gets to the backend
+            run.timings["flush"] = time() - run.ts - run.duration
+        with self._timing("storerun"):
+            await self._backend.storerun(id, runid, run)
+        total = sum(len(data) for _, data in run.data.values())
+        self._runsizes.add(total)
+        written = self._written.setdefault(id, [0, 0])
+        written[0] += 1
+        written[1] += total
+
+    async def _flush(self, world: World, run: RunInfoFull):
+        total = sum(len(data) for _, data in run.data.values())
+        _logger.info(f"flush {world!r} {len(run.data)} items {total} bytes")
+        await self._storerun(world.id, world.runid, run)
+        if self.spill_dir:
+            self._spilled(world.runid).unlink(True)
+        await world.app.hook.submit.trigger(world.id, world.runid, run.ts, run.tags)
+
+    async def _flushone(self, world: World, run: RunInfoFull, fut: _Waiter):
+        try:
+            await self._flush(world, run)
+            if fut and not fut.done():
+                fut.set_result(None)
+        except BaseException as e:
+            if fut and not fut.done():
+                fut.set_exception(e)
+            else:
+                _logger.error(f"could not flush {world!r}", exc_info=e)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+        finally:
+            self._pending.task_done()
+
+    async def _flushing(self):
+        while ...:
+            # take everything that piled up so that the backend gets to see
+            # concurrent `storerun`s (and eg. group them in one transaction)
+            batch = [await self._pending.get()]
+            while not self._pending.empty():
+                batch.append(self._pending.get_nowait())
+            await asyncio.gather(*(self._flushone(*it) for it in batch))
 
     async def _loadrun(self, runid: str) -> RunInfoFull:
-        run = await self._backend.loadrun(runid)
-        if df := self.decompress:
-            for key, (ts, data) in run.data.items():
-                run.data[key] = ts, df(data)
+        with self._timing("loadrun"):
+            run = await self._backend.loadrun(runid)
+        if run.codecs:
+            run = await asyncio.to_thread(self._decode, run)
         return run
 
+    def _cached(self, runid: str) -> RunInfoFull | None:
+        if self.cache_size is None:
+            return None
+        if runid not in self._cache:
+            self.cache_misses += 1
+            return None
+        self.cache_hits += 1
+        self._cache.move_to_end(runid)
+        return self._cache[runid][1]
+
+    def _tocache(self, run: RunInfoFull):
+        size = sum(len(data) for _, data in run.data.values())
+        if self.cache_size is None or self.cache_size < size:
+            return
+        self._uncache([run.runid])
+        self._cache[run.runid] = size, run
+        self._cache_bytes += size
+        while self.cache_size < self._cache_bytes:
+            size, _ = self._cache.popitem(last=False)[1]
+            self._cache_bytes -= size
+
+    def _uncache(self, runids: list[str]):
+        for runid in runids:
+            if it := self._cache.pop(runid, None):
+                self._cache_bytes -= it[0]
+
+    def _spilled(self, runid: str):
+        assert self.spill_dir
+        return self.spill_dir / f"{runid}.spill"
+
+    def _spill(self, world: World, run: RunInfoFull):
+        pair = world.id, world.runid
+        _logger.info(f"spilling {world!r} ({self._inmemory[pair]} bytes)")
+        journal = _Journal(self._spilled(world.runid), world.id, run.runid, run.ts)
+        for tag in run.tags:
+            journal.tag(tag)
+        for key, (ts, data) in run.data.items():
+            journal.append(ts, key, data)
+        run.data.clear()
+        self._journals[pair] = journal
+        del self._inmemory[pair]
+
+    def _unspill(self, journal: _Journal, run: RunInfoFull) -> RunInfoFull:
+        journal.close()
+        _, _, _, _, data = _Journal.read(journal.path)
+        return replace(run, data=data)
+
+    async def _recover(self):
+        assert self.spill_dir
+        for path in self.spill_dir.glob("*.spill"):
+            if not self.spill_recover:
+                _logger.warning(f"discarding unfinished run {path.stem!r}")
+                path.unlink()
+                continue
+            try:
+                id, runid, ts, tags, data = await asyncio.to_thread(_Journal.read, path)
+                try:
+                    # stored already, it only crashed before the unlink
+                    await self._backend.loadrunlazy(runid)
+                    path.unlink()
+                    continue
+                except LookupError:
+                    pass
+                _logger.warning(f"recovering unfinished run {runid!r} of {id!r}")
+                run = RunInfoFull(ts, runid, tags | {"recovered"}, data)
+                await self._storerun(id, runid, run)
+                path.unlink()
+            except Exception as e:
+                _logger.error(f"could not recover {path}", exc_info=e)
+
+    @contextmanager
+    def tracking(self, world: World, op: str):
+        """time spent in `op` in the run of `world`, summed"""
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            timings = self._optimes.setdefault((world.id, world.runid), {})
+            timings[op] = timings.get(op, 0.0) + perf_counter() - start
+
     def store(self, world: World, key: str, data: bytes):
         """ """
         # pacifier and context are responsible for asserting that
@@ -106,11 +621,24 @@ class Store:
         assert not world._pacifier or world._pacifier.is_new
         ts = time()
 
-        entries = self._ongoing[world.id, world.runid].data
-        if key in entries:
-            search_free = (f"{key} ({n})" for n in range(99))
-            key = next(nkey for nkey in search_free if nkey not in entries)
-        entries[key] = ts, data
+        pair = world.id, world.runid
+        run = self._ongoing[pair]
+        assert isinstance(run, RunInfoFull)
+        journal = self._journals.get(pair)
+        taken = journal.keys if journal else run.data
+        index = self._keyindex[pair]
+        base = key
+        key = index.next(base)
+        while key in taken:  # only if eg. "a (0)" was itself stored as a key
+            key = index.next(base)
+        if journal:
+            journal.append(ts, key, data)
+        else:
+            run.data[key] = ts, data
+            if self.spill_dir:
+                self._inmemory[pair] = self._inmemory.get(pair, 0) + len(data)
+                if self.spill_size < self._inmemory[pair]:
+                    self._spill(world, run)
 
         if world._pacifier:
             _logger.debug(f"store({world!r}, {key!r}): has %s", world._pacifier)
@@ -122,11 +650,17 @@ class Store:
         # the run (runid) *actually* exists
         assert world._pacifier and not world._pacifier.is_new
 
-        entries = self._ongoing[world.id, world.runid].data
-        if key not in entries:
-            search_present = (f"{key} ({n})" for n in range(99))
-            key = next(nkey for nkey in search_present if nkey in entries)
-        ts, data = entries[key]
+        run = self._ongoing[world.id, world.runid]
+        assert isinstance(run, RunInfoLazy)
+        # sequential loads of a same key replay its occurrences in order
+        nkey = self._keyindex[world.id, world.runid].next(key)
+        if nkey not in run.sizes:
+            raise LookupError(f"no more {key!r} in {world!r} (wanted {nkey!r})")
+        key = nkey
+        ts, _ = run.sizes[key]
+        prefetched = self._prefetched.get((world.id, world.runid), {})
+        if (data := prefetched.pop(key, None)) is None:
+            data = self._decoded(run, key, run.reader.read(key))
 
         _logger.debug(f"load({world!r}, {key!r}): has %s", world._pacifier)
         data = world._pacifier.loading(world, key, ts, data)
@@ -135,41 +669,123 @@ class Store:
     def tagrun(self, world: World, tag: str):
         assert not world._pacifier or world._pacifier.is_new
         self._ongoing[world.id, world.runid].tags.add(tag)
+        if journal := self._journals.get((world.id, world.runid)):
+            journal.tag(tag)
+
+    def _decoded(self, run: RunInfoLazy, key: str, data: bytes):
+        if codec := run.codecs.get(key):
+            data = self.codecs[codec][1](data)
+        return data
+
+    def _prefetch(self, run: RunInfoLazy):
+        """blocking, see `replay_prefetch_size`"""
+        return {
+            key: self._decoded(run, key, run.reader.read(key))
+            for key, (_, size) in run.sizes.items()
+            if size <= self.replay_prefetch_size
+        }
 
     async def beginrun(self, world: World):
         """
         namin is crap; called when a World obj is __aenter__
-        - pacifier (replayin) loadall once so load() can be sync
+        - pacifier (replayin) load the run lazily, small keys are fetched
+          (thread) right away, load() fetches the others (sync)
         - no pacifier (real event) not much ig
         """
         pair = world.id, world.runid
+        self._keyindex.setdefault(pair, _KeyIndex())
         if world._pacifier and not world._pacifier.is_new:
             _logger.debug(f"beginrun({world!r}): has %s", world._pacifier)
             if pair not in self._ongoing:
-                run = await self._loadrun(world.runid)
+                run = await self.loadrunlazy(world.runid)
                 self._ongoing.setdefault(pair, run)
+                data = await asyncio.to_thread(self._prefetch, run)
+                self._prefetched.setdefault(pair, data)
         else:
             self._ongoing.setdefault(pair, RunInfoFull(time(), world.runid, set(), {}))
 
-    async def finishrun(self, world: World):
+    async def finishrun(self, world: World, exc: BaseException | None = None):
         """
         namin is crap; called when a World obj is __aexit__
         - pacifier (replayin) drop loaded stuff
         - no pacifier (real event) saveall to backing
         """
+        self._keyindex.pop((world.id, world.runid), None)
+        timings = self._optimes.pop((world.id, world.runid), {})
         if world._pacifier and not world._pacifier.is_new:
             _logger.debug(f"finishrun({world!r}): has %s", world._pacifier)
             del self._ongoing[(world.id, world.runid)]
+            self._prefetched.pop((world.id, world.runid), None)
         else:
             run = self._ongoing.pop((world.id, world.runid))
-            total = sum(len(data) for _, data in run.data.values())
-            _logger.info(f"flush {world!r} {len(run.data)} items {total} bytes")
-            await self._backend.storerun(world.id, world.runid, run)
-            await world.app.hook.submit.trigger(world.id, world.runid, run.ts, run.tags)
+            assert isinstance(run, RunInfoFull)
+            self._inmemory.pop((world.id, world.runid), None)
+            if journal := self._journals.pop((world.id, world.runid), None):
+                run = await asyncio.to_thread(self._unspill, journal, run)
+            run = replace(
+                run,
+                duration=time() - run.ts,
+                outcome="ok" if exc is None else type(exc).__name__,
+                timings=timings,
+            )
+            # not entered or running from an other loop (eg. `procs.doevent`
+            # thread): the queue and its flusher belong to the main loop
+            loop = asyncio.get_running_loop()
+            if not self._flusher or self._flusher.get_loop() is not loop:
+                await self._flush(world, run)
+                return
+
+            fut = loop.create_future() if "commit" == self.durability else None
+            await self._pending.put((world, run, fut))
+            if fut:
+                await fut
 
     async def loadrun(self, runid: str):
         """ """
-        return await self._loadrun(runid)
+        if run := self._cached(runid):
+            return run
+        run = await self._loadrun(runid)
+        self._tocache(run)
+        return run
+
+    async def loadrunlazy(self, runid: str) -> RunInfoLazy:
+        """only keys are loaded, see `loaddata` and `streamdata`"""
+        # (a cached run is already decoded, no need for the backend at all)
+        if runid in self._cache and (run := self._cached(runid)):
+            sizes = {key: (ts, len(data)) for key, (ts, data) in run.data.items()}
+            reader = _DictReader(run.data)
+            return RunInfoLazy(run.ts, runid, run.tags, sizes, {}, reader, **run.meta())
+        with self._timing("loadrunlazy"):
+            return await self._backend.loadrunlazy(runid)
+
+    async def loaddata(self, run: RunInfoLazy, key: str) -> bytes:
+        """ """
+        data = await run.reader.aread(key)
+        if codec := run.codecs.get(key):
+            data = await asyncio.to_thread(self.codecs[codec][1], data)
+        return data
+
+    async def streamdata(
+        self,
+        run: RunInfoLazy,
+        key: str,
+        size: int = 2**16,
+    ) -> AsyncIterator[bytes]:
+        """ """
+        codec = run.codecs.get(key)
+        if codec and self.codecs[codec][1] is not zlib.decompress:
+            # no way to know if an arbitrary codec can be streamed
+            data = memoryview(await self.loaddata(run, key))
+            for k in range(0, len(data), size):
+                yield bytes(data[k : k + size])
+            return
+
+        dec = zlib.decompressobj() if codec else None
+        it = run.reader.chunks(key, size)
+        while chunk := await asyncio.to_thread(next, it, b""):
+            yield dec.decompress(chunk) if dec else chunk
+        if dec and (rest := dec.flush()):
+            yield rest
 
     async def listruns(
         self,
@@ -178,21 +794,202 @@ class Store:
         min_ts: float,
         max_ts: float,
         any_tag: set[str],
+        min_duration: float | None = None,
+        failed_only: bool = False,
     ) -> list[RunInfoPartial]:
         """ """
-        return await self._backend.listruns(
+        with self._timing("listruns"):
+            return await self._backend.listruns(
+                id,
+                min_ts=min_ts,
+                max_ts=max_ts,
+                any_tag=any_tag,
+                min_duration=min_duration,
+                failed_only=failed_only,
+            )
+
+    async def iterruns(
+        self,
+        id: str,
+        *,
+        min_ts: float,
+        max_ts: float,
+        any_tag: set[str],
+        after: tuple[float, str] | None = None,
+        limit: int | None = None,
+        descending: bool = False,
+    ) -> AsyncIterator[RunInfoPartial]:
+        """ """
+        it = self._backend.iterruns(
             id,
             min_ts=min_ts,
             max_ts=max_ts,
             any_tag=any_tag,
+            after=after,
+            limit=limit,
+            descending=descending,
         )
+        # (timed without what the caller does in between runs)
+        took = 0.0
+        try:
+            while ...:
+                start = perf_counter()
+                try:
+                    run = await anext(it)
+                except StopAsyncIteration:
+                    break
+                finally:
+                    took += perf_counter() - start
+                yield run
+        finally:
+            self._timings.setdefault("iterruns", _Histogram()).add(took)
+            if isinstance(it, AsyncGenerator):
+                await it.aclose()
 
     async def knowntags(self) -> set[str]:
-        return await self._backend.knowntags()
+        with self._timing("knowntags"):
+            return await self._backend.knowntags()
+
+    async def rollups(self, id: str, *, min_ts: float, max_ts: float) -> list[Rollup]:
+        """per hour (older ones maybe per day) counts of runs, bytes, keys, tags"""
+        with self._timing("rollups"):
+            return await self._backend.rollups(id, min_ts=min_ts, max_ts=max_ts)
+
+    async def exportruns(
+        self,
+        path: str | Path,
+        ids: Iterable[str],
+        *,
+        min_ts: float,
+        max_ts: float,
+        any_tag: set[str],
+        chunk_size: int = 2**20,
+    ) -> int:
+        """
+        runs of handlers `ids` into an archive at `path`, one at a time and
+        with their data as stored (not decoded); gives how many runs
+        """
+        writer = await asyncio.to_thread(_ArchiveWriter, Path(path), chunk_size)
+        try:
+            for id in ids:
+                async for it in self.iterruns(
+                    id, min_ts=min_ts, max_ts=max_ts, any_tag=any_tag
+                ):
+                    run = await self.loadrunlazy(it.runid)
+                    await asyncio.to_thread(writer.writerun, id, run)
+        finally:
+            await asyncio.to_thread(writer.close)
+        return writer.runs
+
+    async def importruns(
+        self,
+        path: str | Path,
+        *,
+        batch_runs: int = 64,
+        batch_bytes: int = 2**26,
+    ) -> int:
+        """
+        runs from an archive made by `exportruns`, stored by batches (of at
+        most `batch_runs` runs or `batch_bytes` bytes) as is (not re-encoded);
+        runs already there are skipped, so an import can be resumed;
+        gives how many runs were imported
+        """
+        reader = await asyncio.to_thread(_ArchiveReader, Path(path))
+        batch = list[tuple[str, str, RunInfoFull]]()
+        size = imported = 0
+        try:
+            while it := await asyncio.to_thread(reader.readrun):
+                id, fields = it
+                run = RunInfoFull(**fields)
+                for key, codec in run.codecs.items():
+                    if codec not in self.codecs:
+                        raise LookupError(
+                            f"unknown codec {codec!r} for {key!r} in {run.runid!r}"
+                        )
+                try:
+                    await self._backend.loadrunlazy(run.runid)
+                    continue
+                except LookupError:
+                    pass
+                batch.append((id, run.runid, run))
+                size += sum(len(data) for _, data in run.data.values())
+                if batch_runs <= len(batch) or batch_bytes <= size:
+                    with self._timing("storeruns"):
+                        await self._backend.storeruns(batch)
+                    imported += len(batch)
+                    batch.clear()
+                    size = 0
+            if batch:
+                with self._timing("storeruns"):
+                    await self._backend.storeruns(batch)
+                imported += len(batch)
+        finally:
+            await asyncio.to_thread(reader.close)
+        return imported
+
+    async def search(
+        self,
+        query: str,
+        *,
+        ids: list[str] | None = None,
+        limit: int = 100,
+        raw: bool = False,
+    ) -> list[SearchHit]:
+        """
+        runs whose (text) data has every word of `query`, among handlers `ids`
+        if given; with `raw` the query is passed as is to the backend (eg.
+        sqlite's FTS5 syntax)
+        """
+        if not raw:
+            # each word as a quoted string, so "ORD-123" is not an expression
+            query = " ".join('"' + w.replace('"', '""') + '"' for w in query.split())
+        with self._timing("search"):
+            return await self._backend.search(query, ids=ids, limit=limit)
+
+    def metrics(self) -> dict[str, object]:
+        """
+        latencies (in seconds) of the backend operations, sizes (in bytes,
+        as stored) of the runs written and in-flight; everything since start
+        """
+        ongoing = [
+            run for run in self._ongoing.values() if isinstance(run, RunInfoFull)
+        ]
+        return {
+            "ops": {op: it.asdict() for op, it in self._timings.items()},
+            "written": {
+                "runs": self._runsizes.asdict(),
+                "handlers": {
+                    id: {"runs": runs, "bytes": size}
+                    for id, (runs, size) in self._written.items()
+                },
+            },
+            "ongoing": {
+                "runs": len(self._ongoing),
+                "recording": len(ongoing),
+                "bytes": sum(
+                    len(data) for run in ongoing for _, data in run.data.values()
+                ),
+                "pending": self._pending.qsize(),
+                "spilled": len(self._journals),
+            },
+            "cache": {
+                "runs": len(self._cache),
+                "bytes": self._cache_bytes,
+                "hits": self.cache_hits,
+                "misses": self.cache_misses,
+            },
+            "backend": self._backend.metrics(),
+        }
 
     async def __aenter__(self):
         """ """
-        return await self._backend.__aenter__()
+        r = await self._backend.__aenter__()
+        if self.spill_dir:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+            await self._recover()
+        if self.write_behind:
+            self._flusher = asyncio.create_task(self._flushing())
+        return r
 
     async def __aexit__(
         self,
@@ -201,4 +998,10 @@ class Store:
         traceback: TracebackType | None = None,
     ):
         """ """
+        if self._flusher:
+            # drain whatever is still queued before the backend goes away
+            await self._pending.join()
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
         return await self._backend.__aexit__(exc_type, exc_value, traceback)
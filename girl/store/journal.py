@@ -0,0 +1,71 @@
+import json
+import struct
+from logging import getLogger
+from pathlib import Path
+
+_logger = getLogger(__name__)
+
+# kind (b"h"eader, b"d"ata, b"t"ag), ts, length of key, length of data;
+# followed by the key (utf-8) and the data
+_RECORD = struct.Struct("<cdII")
+
+
+class _Journal:
+    """
+    append-only file for an in-flight run that got too big to stay in memory,
+    see `Store.spill_size`; the first record is a header with the json of the
+    id and runid, every data and tag goes after
+    """
+
+    __slots__ = ("path", "keys", "_file")
+
+    def __init__(self, path: Path, id: str, runid: str, ts: float):
+        self.path = path
+        self.keys = set[str]()
+        self._file = path.open("wb")
+        head = json.dumps({"id": id, "runid": runid}).encode()
+        self._write(b"h", ts, head, b"")
+
+    def _write(self, kind: bytes, ts: float, key: bytes, data: bytes):
+        self._file.write(_RECORD.pack(kind, ts, len(key), len(data)))
+        self._file.write(key)
+        self._file.write(data)
+
+    def append(self, ts: float, key: str, data: bytes):
+        self.keys.add(key)
+        self._write(b"d", ts, key.encode(), data)
+
+    def tag(self, tag: str):
+        self._write(b"t", 0, tag.encode(), b"")
+
+    def close(self):
+        self._file.close()
+
+    @staticmethod
+    def read(path: Path):
+        """
+        blocking, gives id, runid, ts, tags and data; a truncated last record
+        (crashed while writing) is dropped
+        """
+        id = runid = ""
+        start = 0.0
+        tags = set[str]()
+        data = dict[str, tuple[float, bytes]]()
+        with path.open("rb") as f:
+            while len(head := f.read(_RECORD.size)) == _RECORD.size:
+                kind, ts, klen, dlen = _RECORD.unpack(head)
+                key = f.read(klen)
+                it = f.read(dlen)
+                if len(key) != klen or len(it) != dlen:
+                    _logger.warning(f"truncated record at the end of {path}")
+                    break
+                if b"h" == kind:
+                    meta = json.loads(key)
+                    id, runid, start = meta["id"], meta["runid"], ts
+                elif b"t" == kind:
+                    tags.add(key.decode())
+                else:
+                    data[key.decode()] = ts, it
+        if not runid:
+            raise ValueError(f"no header in {path}")
+        return id, runid, start, tags, data
@@ -1,24 +1,170 @@
-from copy import deepcopy
+import asyncio
+from bisect import bisect_left
+from bisect import bisect_right
+from bisect import insort
+from collections import Counter
+from collections import OrderedDict
+from datetime import timedelta
+from hashlib import sha256
+from logging import getLogger
+from time import time
+from types import MappingProxyType
+from typing import cast
 
 from .base import Base
 from .base import RunInfoFull
+from .base import RunInfoLazy
 from .base import RunInfoPartial
+from .base import _DictReader
+from .base import _rollup
+from .base import _Rollups
+from .base import _rollups_between
+
+_logger = getLogger(__name__)
 
 
 class BackendMemory(Base):
     """ """
 
-    def __init__(self):
-        self._runs = dict[str, dict[str, RunInfoFull]]()
+    def __init__(
+        self,
+        *,
+        max_runs: int | None = None,
+        max_bytes: int | None = None,
+        # rollups whose bucket ended longer ago than this are removed
+        rollup_expire: timedelta | None = None,
+    ):
+        # least recently used first, see `_get`
+        self._runs = OrderedDict[str, RunInfoFull]()
+        self._ids = dict[str, str]()
+        # per handler, (ts, runid) kept sorted for range queries
+        self._byid = dict[str, list[tuple[float, str]]]()
+        self._bytag = dict[str, set[str]]()
         self._tags = set[str]()
+        # content-addressed: runs share the very same `bytes` object for
+        # identical data, refcounted by hash
+        self._blobs = dict[bytes, bytes]()
+        self._refs = Counter[bytes]()
+        self._hashes = dict[str, list[bytes]]()
+        self._bytes = 0
+        self._evicted = 0
+        # per handler, by bucket ts; evicting runs does not change them
+        self._rollups = _Rollups()
+
+        self.max_runs = max_runs
+        self.max_bytes = max_bytes
+        self.rollup_expire = rollup_expire
+
+    def _get(self, runid: str):
+        if runid not in self._runs:
+            raise LookupError(f"no run with runid {runid!r}")
+        self._runs.move_to_end(runid)
+        return self._runs[runid]
+
+    def _evict(self, runid: str):
+        run = self._runs.pop(runid)
+        id = self._ids.pop(runid)
+        runs = self._byid[id]
+        del runs[bisect_left(runs, (run.ts, runid))]
+        if not runs:
+            del self._byid[id]
+        for tag in run.tags:
+            self._bytag[tag].discard(runid)
+        for hash in self._hashes.pop(runid):
+            self._refs[hash] -= 1
+            if self._refs[hash] <= 0:
+                del self._refs[hash]
+                self._bytes -= len(self._blobs.pop(hash))
+
+    def _expire(self):
+        if self.rollup_expire is None:
+            return
+        expire = time() - self.rollup_expire.total_seconds()
+        for id, rollups in list(self._rollups.items()):
+            for ts in [ts for ts, it in rollups.items() if ts + it.width <= expire]:
+                del rollups[ts]
+            if not rollups:
+                del self._rollups[id]
+
+    def _bound(self):
+        while self._runs and (
+            (self.max_runs is not None and self.max_runs < len(self._runs))
+            or (self.max_bytes is not None and self.max_bytes < self._bytes)
+        ):
+            runid = next(iter(self._runs))
+            _logger.debug(f"evicting run {runid!r}")
+            self._evict(runid)
+            self._evicted += 1
+            self._forgot([runid])
 
     async def storerun(self, id: str, runid: str, run: RunInfoFull):
-        self._runs.setdefault(id, {})[runid] = run
-        self._tags.update(run.tags)
+        # (hashing large data would hold the loop)
+        all = await asyncio.to_thread(
+            lambda: [sha256(it).digest() for _, it in run.data.values()]
+        )
+        if runid in self._runs:
+            self._evict(runid)
+        data = dict[str, tuple[float, bytes]]()
+        hashes = self._hashes[runid] = list[bytes]()
+        for hash, (key, (ts, it)) in zip(all, run.data.items()):
+            hashes.append(hash)
+            if hash not in self._blobs:
+                self._blobs[hash] = it
+                self._bytes += len(it)
+            data[key] = ts, self._blobs[hash]
+            self._refs[hash] += 1
+        # stored frozen, so it can be handed out as is rather than copied
+        tags = frozenset(run.tags)
+        self._runs[runid] = RunInfoFull(
+            run.ts,
+            runid,
+            cast(set[str], tags),
+            cast(dict[str, tuple[float, bytes]], MappingProxyType(data)),
+            cast(dict[str, str], MappingProxyType(run.codecs.copy())),
+            **run.meta(),
+        )
+        self._ids[runid] = id
+        insort(self._byid.setdefault(id, []), (run.ts, runid))
+        for tag in tags:
+            self._bytag.setdefault(tag, set()).add(runid)
+        self._tags.update(tags)
+        size = sum(len(it) for _, it in data.values())
+        if _rollup(self._rollups, id, run.ts, size, len(data), tags):
+            self._expire()
+        self._bound()
 
     async def loadrun(self, runid: str):
-        bag = next(runs for runs in self._runs.values() if runid in runs)
-        return deepcopy(bag[runid])
+        # read-only views, `Store._decode` copies when it needs to
+        return self._get(runid)
+
+    async def loadrunlazy(self, runid: str):
+        run = self._get(runid)
+        sizes = {key: (ts, len(data)) for key, (ts, data) in run.data.items()}
+        return RunInfoLazy(
+            run.ts,
+            runid,
+            run.tags,
+            sizes,
+            run.codecs,
+            _DictReader(run.data),
+            **run.meta(),
+        )
+
+    def _range(self, id: str, min_ts: float, max_ts: float, any_tag: set[str]):
+        runs = self._byid.get(id, [])
+        lo = bisect_left(runs, (min_ts,))
+        hi = bisect_left(runs, (max_ts,))
+        if not any_tag:
+            return runs[lo:hi]
+        tagged = set[str]().union(*(self._bytag.get(tag, ()) for tag in any_tag))
+        if len(tagged) < hi - lo:
+            # fewer tagged runs than in the range, go through these instead
+            return sorted(
+                (self._runs[runid].ts, runid)
+                for runid in tagged
+                if id == self._ids[runid] and min_ts <= self._runs[runid].ts < max_ts
+            )
+        return [it for it in runs[lo:hi] if it[1] in tagged]
 
     async def listruns(
         self,
@@ -27,18 +173,55 @@ class BackendMemory(Base):
         min_ts: float,
         max_ts: float,
         any_tag: set[str],
+        min_duration: float | None = None,
+        failed_only: bool = False,
+    ):
+        r = list[RunInfoPartial]()
+        for ts, runid in self._range(id, min_ts, max_ts, any_tag):
+            run = self._runs[runid]
+            if min_duration is not None and (
+                run.duration is None or run.duration < min_duration
+            ):
+                continue
+            if failed_only and not run.failed:
+                continue
+            r.append(RunInfoPartial(ts, runid, run.tags, **run.meta()))
+        return r
+
+    async def iterruns(
+        self,
+        id: str,
+        *,
+        min_ts: float,
+        max_ts: float,
+        any_tag: set[str],
+        after: tuple[float, str] | None = None,
+        limit: int | None = None,
+        descending: bool = False,
     ):
-        return [
-            RunInfoPartial(run.ts, runid, run.tags)
-            for runid, run in self._runs.get(id, {}).items()
-            if min_ts <= run.ts < max_ts and any_tag & run.tags
-        ]
+        runs = self._range(id, min_ts, max_ts, any_tag)
+        if descending:
+            if after:
+                runs = runs[: bisect_left(runs, after)]
+            runs.reverse()
+        elif after:
+            runs = runs[bisect_right(runs, after) :]
+        for ts, runid in runs[:limit]:
+            run = self._runs[runid]
+            yield RunInfoPartial(ts, runid, run.tags, **run.meta())
 
     async def knowntags(self):
         return self._tags.copy()
 
+    async def rollups(self, id: str, *, min_ts: float, max_ts: float):
+        self._expire()
+        return _rollups_between(self._rollups, id, min_ts, max_ts)
+
     async def status(self):
-        return "(hellow)"
+        r = f"{len(self._runs)} runs, {self._bytes} bytes"
+        if self._evicted:
+            r += f", {self._evicted} evicted"
+        return r
 
     async def __aenter__(self):
         pass
@@ -0,0 +1,386 @@
+import asyncio
+from bisect import insort
+from collections.abc import Callable
+from contextlib import asynccontextmanager
+from dataclasses import replace
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+from logging import getLogger
+from pathlib import Path
+from time import perf_counter
+from time import time
+from weakref import finalize
+
+import aiosqlite
+
+from .base import Base
+from .base import DataReader
+from .base import Rollup
+from .base import RunInfoFull
+from .base import _Histogram
+from .sqlite import BackendSqlite
+
+_logger = getLogger(__name__)
+
+_FORMAT = "%Y%m%dT%H%M%SZ"
+
+_INDEX = r"""
+ CREATE TABLE IF NOT EXISTS runs (
+    runid TEXT PRIMARY KEY NOT NULL,
+    start INTEGER          NOT NULL) -- partition the run is in
+ STRICT, WITHOUT ROWID;
+
+ CREATE INDEX IF NOT EXISTS runs_start ON runs(start);
+
+ CREATE TABLE IF NOT EXISTS known_tags (
+    tag   TEXT PRIMARY KEY NOT NULL)
+ STRICT, WITHOUT ROWID;
+ """
+
+
+class _PinningReader(DataReader):
+    """the reader of a lazy run, keeping its partition open, see `loadrunlazy`"""
+
+    def __init__(self, reader: DataReader):
+        self._reader = reader
+
+    def read(self, key: str):
+        return self._reader.read(key)
+
+    def chunks(self, key: str, size: int):
+        return self._reader.chunks(key, size)
+
+    def path(self, key: str):
+        return self._reader.path(key)
+
+
+def _unpin(loop: asyncio.AbstractEventLoop, unuse: Callable[[int], None], start: int):
+    # (the last reference can be dropped from any thread, or after the loop)
+    try:
+        loop.call_soon_threadsafe(unuse, start)
+    except RuntimeError:
+        pass
+
+
+class BackendSqlitePartitioned(Base):
+    """one `BackendSqlite` database file per time window (of the runs' ts)
+
+    partitions are named after the (UTC) start of their window, and are only
+    opened when a query overlaps them, at most `max_open` at once (the least
+    recently used idle one is closed, a lazy run keeps its partition in use);
+    `index.sqlite` maps each runid to its partition (and has the known tags)
+
+    only the partition of the current window gets reader connections (see
+    `BackendSqlite.readers`), older ones are mostly only read every now and
+    then and make do with a single connection
+
+    retention removes whole partition files, no `DELETE` nor vacuuming
+    """
+
+    def __init__(
+        self,
+        directory: str | Path,
+        /,
+        *,
+        # do not change it for an existing directory
+        window: timedelta = timedelta(days=1),
+        # only keep so many partitions, the most recent ones
+        roll_partitions: int | None = None,
+        # remove partitions whose window ended before this long ago
+        roll_old_entries: timedelta | None = None,
+        roll_interval: float = 60,
+        # partitions kept open (a `BackendSqlite` is a few threads)
+        max_open: int = 4,
+        # anything else is for each `BackendSqlite`
+        **options: ...,
+    ):
+        self._directory = Path(directory)
+        self._window = int(window.total_seconds())
+        self._options = options
+
+        # start of each partition that exists (sorted), and the opened ones
+        # (least recently used first) with how many are using them
+        self._starts = list[int]()
+        self._parts = dict[int, BackendSqlite]()
+        self._using = dict[int, int]()
+        self._opening = asyncio.Lock()
+        self.max_open = max_open
+        self._index: aiosqlite.Connection
+
+        self.roll_partitions = roll_partitions
+        self.roll_old_entries = roll_old_entries
+        self.roll_interval = roll_interval
+        self._roller: asyncio.Task[None] | None = None
+        self._roller_stop = asyncio.Event()
+        self._roll_timings = _Histogram()
+
+    def _path(self, start: int):
+        name = datetime.fromtimestamp(start, timezone.utc).strftime(_FORMAT)
+        return self._directory / f"{name}.sqlite"
+
+    def _startof(self, ts: float):
+        return int(ts // self._window * self._window)
+
+    def _overlapping(self, min_ts: float, max_ts: float):
+        return [s for s in self._starts if min_ts < s + self._window and s <= max_ts]
+
+    @asynccontextmanager
+    async def _partition(self, start: int):
+        if (part := self._parts.get(start)) is None:
+            async with self._opening:
+                if (part := self._parts.get(start)) is None:
+                    options = self._options
+                    if start != self._startof(time()):
+                        options = options | {"readers": 0}
+                    part = BackendSqlite(self._path(start), **options)
+                    part._forgetting = self._forgot
+                    await part.__aenter__()
+                    self._parts[start] = part
+                    if start not in self._starts:
+                        insort(self._starts, start)
+        # (most recently used last)
+        self._parts[start] = self._parts.pop(start)
+        self._using[start] = self._using.get(start, 0) + 1
+        try:
+            yield part
+        finally:
+            self._unuse(start)
+            await self._close_idle()
+
+    def _unuse(self, start: int):
+        if self._using[start] <= 1:
+            del self._using[start]
+        else:
+            self._using[start] -= 1
+
+    async def _close_idle(self):
+        async with self._opening:
+            while self.max_open < len(self._parts):
+                idle = [s for s in self._parts if s not in self._using]
+                if not idle:
+                    break
+                await self._parts.pop(idle[0]).__aexit__(None, None, None)
+
+    async def _located(self, runid: str):
+        all = await self._index.execute_fetchall(
+            r"SELECT start FROM runs WHERE ? = runid",
+            (runid,),
+        )
+        if not all or int(all[0][0]) not in self._starts:
+            raise LookupError(f"no run for {runid!r}")
+        return int(all[0][0])
+
+    async def storerun(self, id: str, runid: str, run: RunInfoFull):
+        start = self._startof(run.ts)
+        # indexed first, so a run is never in a partition but not found
+        await self._index.execute(
+            r"INSERT INTO runs VALUES (?, ?)",
+            (runid, start),
+        )
+        await self._index.executemany(
+            r"INSERT INTO known_tags VALUES (?) ON CONFLICT DO NOTHING",
+            [(tag,) for tag in run.tags],
+        )
+        await self._index.commit()
+        try:
+            async with self._partition(start) as part:
+                await part.storerun(id, runid, run)
+        except BaseException:
+            await self._index.execute(r"DELETE FROM runs WHERE ? = runid", (runid,))
+            await self._index.commit()
+            raise
+
+    async def loadrun(self, runid: str):
+        async with self._partition(await self._located(runid)) as part:
+            return await part.loadrun(runid)
+
+    async def loadrunlazy(self, runid: str):
+        start = await self._located(runid)
+        async with self._partition(start) as part:
+            run = await part.loadrunlazy(runid)
+            # the partition stays in use (open) for as long as the reader lives
+            self._using[start] += 1
+        reader = _PinningReader(run.reader)
+        loop = asyncio.get_running_loop()
+        finalize(reader, _unpin, loop, self._unuse, start)
+        return replace(run, reader=reader)
+
+    async def listruns(
+        self,
+        id: str,
+        *,
+        min_ts: float,
+        max_ts: float,
+        any_tag: set[str],
+        min_duration: float | None = None,
+        failed_only: bool = False,
+    ):
+        r = []
+        # partitions are by ts, so these are just put one after the other
+        for start in self._overlapping(min_ts, max_ts):
+            async with self._partition(start) as part:
+                r += await part.listruns(
+                    id,
+                    min_ts=min_ts,
+                    max_ts=max_ts,
+                    any_tag=any_tag,
+                    min_duration=min_duration,
+                    failed_only=failed_only,
+                )
+        return r
+
+    async def iterruns(
+        self,
+        id: str,
+        *,
+        min_ts: float,
+        max_ts: float,
+        any_tag: set[str],
+        after: tuple[float, str] | None = None,
+        limit: int | None = None,
+        descending: bool = False,
+    ):
+        starts = self._overlapping(min_ts, max_ts)
+        if descending:
+            starts.reverse()
+        if after:
+            # (whole partitions before the cursor are not even opened)
+            starts = [
+                s
+                for s in starts
+                if (s <= after[0] if descending else after[0] < s + self._window)
+            ]
+        for start in starts:
+            if limit is not None and limit <= 0:
+                break
+            async with self._partition(start) as part:
+                async for run in part.iterruns(
+                    id,
+                    min_ts=min_ts,
+                    max_ts=max_ts,
+                    any_tag=any_tag,
+                    after=after,
+                    limit=limit,
+                    descending=descending,
+                ):
+                    yield run
+                    if limit is not None:
+                        limit -= 1
+
+    async def knowntags(self):
+        all = await self._index.execute_fetchall("SELECT tag FROM known_tags")
+        return set(str(t) for t, in all)
+
+    async def rollups(self, id: str, *, min_ts: float, max_ts: float):
+        # (a bucket can be split across partitions if it is wider than them)
+        r = dict[float, Rollup]()
+        for start in self._overlapping(min_ts, max_ts):
+            async with self._partition(start) as part:
+                all = await part.rollups(id, min_ts=min_ts, max_ts=max_ts)
+            for it in all:
+                if it.ts in r:
+                    r[it.ts].merge(it)
+                else:
+                    r[it.ts] = it
+        return sorted(r.values(), key=lambda it: it.ts)
+
+    async def search(
+        self,
+        query: str,
+        *,
+        ids: list[str] | None = None,
+        limit: int = 100,
+    ):
+        # (ranks are not comparable across databases, most recent ones first)
+        r = []
+        for start in reversed(self._starts):
+            if limit <= len(r):
+                break
+            async with self._partition(start) as part:
+                r += await part.search(query, ids=ids, limit=limit - len(r))
+        return r
+
+    def _expired(self) -> list[int]:
+        r = set[int]()
+        if self.roll_partitions is not None:
+            r.update(self._starts[: max(0, len(self._starts) - self.roll_partitions)])
+        if self.roll_old_entries is not None:
+            older = time() - self.roll_old_entries.total_seconds()
+            r.update(s for s in self._starts if s + self._window < older)
+        return sorted(r)
+
+    async def _roll(self):
+        for start in self._expired():
+            if start in self._using:
+                continue  # (next time)
+            path = self._path(start)
+            _logger.info(f"removing partition {path.name}")
+            self._starts.remove(start)
+            if part := self._parts.pop(start, None):
+                await part.__aexit__(None, None, None)
+            for it in (path, Path(f"{path}-wal"), Path(f"{path}-shm")):
+                it.unlink(True)
+            all = await self._index.execute_fetchall(
+                r"DELETE FROM runs WHERE ? = start RETURNING runid",
+                (start,),
+            )
+            await self._index.commit()
+            self._forgot([str(runid) for runid, in all])
+
+    async def _rolling(self):
+        while not self._roller_stop.is_set():
+            start = perf_counter()
+            try:
+                await self._roll()
+                self._roll_timings.add(perf_counter() - start)
+            except Exception as e:
+                _logger.error("could not roll", exc_info=e)
+            try:
+                await asyncio.wait_for(self._roller_stop.wait(), self.roll_interval)
+            except TimeoutError:
+                pass
+
+    def metrics(self):
+        return {
+            "roll": self._roll_timings.asdict(),
+            "partitions": len(self._starts),
+            "open": {
+                self._path(start).name: part.metrics()
+                for start, part in self._parts.items()
+            },
+        }
+
+    async def status(self):
+        size = sum(self._path(start).stat().st_size for start in self._starts)
+        n = len(self._starts)
+        return f"{n} partitions ({len(self._parts)} open), {size:_} B"
+
+    async def __aenter__(self):
+        self._directory.mkdir(parents=True, exist_ok=True)
+        self._starts.clear()
+        for path in self._directory.glob("*.sqlite"):
+            try:
+                ts = datetime.strptime(path.stem, _FORMAT)
+            except ValueError:
+                continue
+            insort(self._starts, int(ts.replace(tzinfo=timezone.utc).timestamp()))
+
+        self._index = await aiosqlite.connect(self._directory / "index.sqlite")
+        await self._index.executescript(
+            r"PRAGMA journal_mode = WAL; PRAGMA synchronous = NORMAL;" + _INDEX
+        )
+
+        if self.roll_partitions or self.roll_old_entries:
+            self._roller_stop.clear()
+            self._roller = asyncio.create_task(self._rolling())
+
+    async def __aexit__(self, *_):
+        if roller := self._roller:
+            self._roller_stop.set()
+            await asyncio.gather(roller, return_exceptions=True)
+            self._roller = None
+        for part in self._parts.values():
+            await part.__aexit__(None, None, None)
+        self._parts.clear()
+        await self._index.close()
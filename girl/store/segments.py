@@ -0,0 +1,482 @@
+import asyncio
+import json
+import mmap
+import os
+import struct
+import zlib
+from bisect import bisect_left
+from bisect import bisect_right
+from bisect import insort
+from dataclasses import dataclass
+from dataclasses import field
+from datetime import timedelta
+from logging import getLogger
+from pathlib import Path
+from threading import Lock
+from time import perf_counter
+from time import time
+from typing import Any
+from typing import BinaryIO
+
+from .base import Base
+from .base import DataReader
+from .base import RunInfoFull
+from .base import RunInfoLazy
+from .base import RunInfoPartial
+from .base import _Histogram
+from .base import _rollup
+from .base import _Rollups
+from .base import _rollups_between
+
+_logger = getLogger(__name__)
+
+# a run in a segment file is one record: this fixed header (magic, length of
+# the json header, length of the data, crc32 of both) then the json header
+# then the data of every key back to back, in the order of the json header
+_RECORD = struct.Struct("<4sIII")
+_MAGIC = b"girl"
+
+
+@dataclass(slots=True)
+class _Entry:
+    id: str
+    runid: str
+    ts: float
+    tags: tuple[str, ...]
+    segment: int
+    offset: int
+    length: int
+    # duration, outcome and timings, see `RunInfoPartial.meta`
+    meta: dict[str, Any] = field(default_factory=dict)
+    # of the data (as stored) and nb of keys, for the rollups
+    size: int = 0
+    keys: int = 0
+
+    def line(self):
+        it = self.offset, self.length, self.id, self.runid, self.ts, self.tags
+        return json.dumps((*it, self.meta, self.size, self.keys)).encode() + b"\n"
+
+
+@dataclass(slots=True)
+class _Segment:
+    number: int
+    size: int = 0
+    max_ts: float = 0
+    runids: set[str] = field(default_factory=set)
+    # (re)mapped when reading past its end, see `BackendSegments._map`
+    map: mmap.mmap | None = None
+
+
+class _MmapReader(DataReader):
+    __slots__ = ("_map", "_spans")
+
+    def __init__(self, map: mmap.mmap, spans: dict[str, tuple[int, int]]):
+        self._map = map
+        self._spans = spans
+
+    def read(self, key: str):
+        start, end = self._spans[key]
+        return self._map[start:end]
+
+    def chunks(self, key: str, size: int):
+        start, end = self._spans[key]
+        return (self._map[k : min(k + size, end)] for k in range(start, end, size))
+
+
+class BackendSegments(Base):
+    """append-only log of runs, in rotating segment files
+
+    each `NNNNNNNN.seg` file has a `NNNNNNNN.idx` sidecar with one json line
+    per run (offset, length, id, runid, ts, tags, meta, size, keys); the index
+    of every segment is kept in memory (and the rollups), it is rebuilt from
+    the segments themselves if a sidecar is behind (or missing) when opening
+
+    rollups are only as far back as the segments kept when opening, rolling
+    does not change them until then
+    """
+
+    def __init__(
+        self,
+        directory: str | Path,
+        /,
+        *,
+        # starts a new segment file once the current one is above this
+        segment_size: int = 2**26,
+        # fsync each run (and its index line) before `storerun` returns
+        fsync: bool = True,
+        # only keep so many segment files, oldest first (including the
+        # current one, which is never removed)
+        roll_nb_segments: int | None = None,
+        # remove segments where every run is older than this
+        roll_old_entries: timedelta | None = None,
+        roll_interval: float = 60,
+    ):
+        self._directory = Path(directory)
+        self.segment_size = segment_size
+        self.fsync = fsync
+
+        self._runs = dict[str, _Entry]()
+        # per handler, (ts, runid) kept sorted for range queries
+        self._byid = dict[str, list[tuple[float, str]]]()
+        self._tags = set[str]()
+        self._rollups = _Rollups()
+        self._segments = dict[int, _Segment]()
+        self._maplock = Lock()
+
+        # the current segment, only ever appended to with `_writelock`
+        self._active: _Segment | None = None
+        self._seg: BinaryIO | None = None
+        self._idx: BinaryIO | None = None
+        self._writelock = asyncio.Lock()
+
+        self.roll_nb_segments = roll_nb_segments
+        self.roll_old_entries = roll_old_entries
+        self.roll_interval = roll_interval
+        self._roller: asyncio.Task[None] | None = None
+        self._roller_stop = asyncio.Event()
+        self._roll_timings = _Histogram()
+        self._rolled_segments = 0
+
+    def _path(self, number: int, suffix: str):
+        return self._directory / f"{number:08}.{suffix}"
+
+    def _map(self, segment: _Segment, end: int):
+        with self._maplock:
+            if segment.map is None or len(segment.map) < end:
+                # previous map (if any) is left for readers still holding it
+                with self._path(segment.number, "seg").open("rb") as f:
+                    segment.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return segment.map
+
+    @staticmethod
+    def _scan(map: mmap.mmap, number: int, offset: int) -> _Entry | None:
+        if len(map) < offset + _RECORD.size:
+            return None
+        magic, hlen, dlen, crc = _RECORD.unpack_from(map, offset)
+        start = offset + _RECORD.size
+        if _MAGIC != magic or len(map) < start + hlen + dlen:
+            return None
+        if crc != zlib.crc32(map[start : start + hlen + dlen]):
+            return None
+        head = json.loads(map[start : start + hlen])
+        length = _RECORD.size + hlen + dlen
+        tags = tuple(head["tags"])
+        return _Entry(
+            head["id"],
+            head["runid"],
+            head["ts"],
+            tags,
+            number,
+            offset,
+            length,
+            head.get("meta", {}),
+            dlen,
+            len(head["keys"]),
+        )
+
+    def _recover(self, number: int) -> list[_Entry]:
+        seg = self._path(number, "seg")
+        idx = self._path(number, "idx")
+        size = seg.stat().st_size
+        lines = idx.read_bytes().splitlines() if idx.exists() else []
+
+        entries = list[_Entry]()
+        end = 0
+        for line in lines:
+            try:
+                offset, length, id, runid, ts, tags, *rest = json.loads(line)
+            except ValueError:
+                break
+            # (lines written before meta, size and keys were: scanned again)
+            if offset != end or size < offset + length or len(rest) < 3:
+                break
+            entries.append(
+                _Entry(id, runid, ts, tuple(tags), number, offset, length, *rest)
+            )
+            end = offset + length
+        rewrite = len(entries) != len(lines)
+
+        # records that made it to the segment but not to its sidecar
+        if end < size:
+            with seg.open("rb") as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as map:
+                    while entry := self._scan(map, number, end):
+                        entries.append(entry)
+                        end += entry.length
+            rewrite = True
+        if end < size:
+            _logger.warning(f"truncating {seg} from {size} to {end} bytes")
+            os.truncate(seg, end)
+        if rewrite:
+            _logger.warning(f"rebuilt {idx} ({len(entries)} runs)")
+            idx.write_bytes(b"".join(entry.line() for entry in entries))
+        return entries
+
+    def _index(self, entry: _Entry):
+        if entry.runid in self._runs:
+            self._unindex(entry.runid)
+        self._runs[entry.runid] = entry
+        insort(self._byid.setdefault(entry.id, []), (entry.ts, entry.runid))
+        self._tags.update(entry.tags)
+        segment = self._segments[entry.segment]
+        segment.size = max(segment.size, entry.offset + entry.length)
+        segment.max_ts = max(segment.max_ts, entry.ts)
+        segment.runids.add(entry.runid)
+        _rollup(self._rollups, entry.id, entry.ts, entry.size, entry.keys, entry.tags)
+
+    def _unindex(self, runid: str):
+        entry = self._runs.pop(runid)
+        runs = self._byid[entry.id]
+        del runs[bisect_left(runs, (entry.ts, runid))]
+        if not runs:
+            del self._byid[entry.id]
+        if segment := self._segments.get(entry.segment):
+            segment.runids.discard(runid)
+
+    def _open(self, number: int):
+        self._active = self._segments.setdefault(number, _Segment(number))
+        self._seg = self._path(number, "seg").open("ab")
+        self._idx = self._path(number, "idx").open("ab")
+
+    def _close(self):
+        if self._seg and self._idx:
+            self._seg.close()
+            self._idx.close()
+        self._seg = self._idx = None
+
+    async def _rotate(self):
+        # on the loop (with `_writelock`): rolling and `status` go through
+        # `_segments` and `_active` from it, never from a thread
+        assert self._active
+        number = self._active.number + 1
+        _logger.info(f"starting segment {number}")
+        await asyncio.to_thread(self._close)
+        self._open(number)
+
+    def _append(self, id: str, runid: str, run: RunInfoFull) -> _Entry:
+        """blocking, only touches the files and `_active.size`"""
+        assert self._active and self._seg and self._idx
+        keys = [
+            (key, ts, run.codecs.get(key, ""), len(data))
+            for key, (ts, data) in run.data.items()
+        ]
+        head = json.dumps(
+            {"id": id, "runid": runid, "ts": run.ts, "tags": sorted(run.tags)}
+            | {"meta": run.meta(), "keys": keys}
+        ).encode()
+        crc = zlib.crc32(head)
+        for _, data in run.data.values():
+            crc = zlib.crc32(data, crc)
+        dlen = sum(size for *_, size in keys)
+
+        offset = self._active.size
+        self._seg.write(_RECORD.pack(_MAGIC, len(head), dlen, crc))
+        self._seg.write(head)
+        self._seg.writelines(data for _, data in run.data.values())
+        self._seg.flush()
+        if self.fsync:
+            os.fsync(self._seg.fileno())
+        length = _RECORD.size + len(head) + dlen
+        # (claimed right away, the next `_append` may start from there)
+        self._active.size = offset + length
+
+        tags = tuple(sorted(run.tags))
+        number = self._active.number
+        meta = run.meta()
+        entry = _Entry(
+            id, runid, run.ts, tags, number, offset, length, meta, dlen, len(keys)
+        )
+        self._idx.write(entry.line())
+        self._idx.flush()
+        if self.fsync:
+            os.fsync(self._idx.fileno())
+        return entry
+
+    def _read(self, entry: _Entry):
+        map = self._map(self._segments[entry.segment], entry.offset + entry.length)
+        _, hlen, _, _ = _RECORD.unpack_from(map, entry.offset)
+        start = entry.offset + _RECORD.size
+        head = json.loads(map[start : start + hlen])
+        spans = dict[str, tuple[int, int]]()
+        sizes = dict[str, tuple[float, int]]()
+        codecs = dict[str, str]()
+        start += hlen
+        for key, ts, codec, size in head["keys"]:
+            spans[key] = start, start + size
+            sizes[key] = ts, size
+            if codec:
+                codecs[key] = codec
+            start += size
+        return map, spans, sizes, codecs
+
+    def _get(self, runid: str):
+        if (entry := self._runs.get(runid)) is None:
+            raise LookupError(f"no run for {runid!r}")
+        return entry
+
+    async def storerun(self, id: str, runid: str, run: RunInfoFull):
+        async with self._writelock:
+            assert self._active
+            if self.segment_size <= self._active.size:
+                await self._rotate()
+            entry = await asyncio.to_thread(self._append, id, runid, run)
+        self._index(entry)
+
+    async def loadrun(self, runid: str):
+        entry = self._get(runid)
+
+        def load():
+            map, spans, sizes, codecs = self._read(entry)
+            data = {
+                key: (sizes[key][0], map[start:end])
+                for key, (start, end) in spans.items()
+            }
+            tags = set(entry.tags)
+            return RunInfoFull(entry.ts, runid, tags, data, codecs, **entry.meta)
+
+        return await asyncio.to_thread(load)
+
+    async def loadrunlazy(self, runid: str):
+        entry = self._get(runid)
+        map, spans, sizes, codecs = await asyncio.to_thread(self._read, entry)
+        reader = _MmapReader(map, spans)
+        tags = set(entry.tags)
+        return RunInfoLazy(entry.ts, runid, tags, sizes, codecs, reader, **entry.meta)
+
+    def _range(self, id: str, min_ts: float, max_ts: float, any_tag: set[str]):
+        runs = self._byid.get(id, [])
+        runs = runs[bisect_left(runs, (min_ts,)) : bisect_left(runs, (max_ts,))]
+        if not any_tag:
+            return runs
+        return [it for it in runs if not any_tag.isdisjoint(self._runs[it[1]].tags)]
+
+    async def listruns(
+        self,
+        id: str,
+        *,
+        min_ts: float,
+        max_ts: float,
+        any_tag: set[str],
+        min_duration: float | None = None,
+        failed_only: bool = False,
+    ):
+        r = list[RunInfoPartial]()
+        for ts, runid in self._range(id, min_ts, max_ts, any_tag):
+            entry = self._runs[runid]
+            run = RunInfoPartial(ts, runid, set(entry.tags), **entry.meta)
+            if min_duration is not None and (
+                run.duration is None or run.duration < min_duration
+            ):
+                continue
+            if failed_only and not run.failed:
+                continue
+            r.append(run)
+        return r
+
+    async def iterruns(
+        self,
+        id: str,
+        *,
+        min_ts: float,
+        max_ts: float,
+        any_tag: set[str],
+        after: tuple[float, str] | None = None,
+        limit: int | None = None,
+        descending: bool = False,
+    ):
+        runs = self._range(id, min_ts, max_ts, any_tag)
+        if descending:
+            if after:
+                runs = runs[: bisect_left(runs, after)]
+            runs.reverse()
+        elif after:
+            runs = runs[bisect_right(runs, after) :]
+        for ts, runid in runs[:limit]:
+            entry = self._runs[runid]
+            yield RunInfoPartial(ts, runid, set(entry.tags), **entry.meta)
+
+    async def knowntags(self):
+        return self._tags.copy()
+
+    async def rollups(self, id: str, *, min_ts: float, max_ts: float):
+        return _rollups_between(self._rollups, id, min_ts, max_ts)
+
+    def _expired(self) -> list[int]:
+        assert self._active
+        numbers = sorted(n for n in self._segments if n != self._active.number)
+        r = set[int]()
+        if self.roll_nb_segments is not None:
+            r.update(numbers[: max(0, len(numbers) + 1 - self.roll_nb_segments)])
+        if self.roll_old_entries is not None:
+            older = time() - self.roll_old_entries.total_seconds()
+            r.update(n for n in numbers if self._segments[n].max_ts < older)
+        return sorted(r)
+
+    async def _roll(self):
+        # whole segments at once, nothing to rewrite
+        for number in self._expired():
+            segment = self._segments.pop(number)
+            _logger.info(f"removing segment {number} ({len(segment.runids)} runs)")
+            for runid in list(segment.runids):
+                self._unindex(runid)
+            self._forgot(list(segment.runids))
+            # (readers still holding its map can finish reading)
+            segment.map = None
+            for suffix in ("seg", "idx"):
+                await asyncio.to_thread(self._path(number, suffix).unlink, True)
+            self._rolled_segments += 1
+
+    async def _rolling(self):
+        while not self._roller_stop.is_set():
+            start = perf_counter()
+            try:
+                await self._roll()
+                self._roll_timings.add(perf_counter() - start)
+            except Exception as e:
+                _logger.error("could not roll", exc_info=e)
+            try:
+                await asyncio.wait_for(self._roller_stop.wait(), self.roll_interval)
+            except TimeoutError:
+                pass
+
+    def metrics(self):
+        return {
+            "roll": self._roll_timings.asdict(),
+            "rolled": self._rolled_segments,
+            "segments": len(self._segments),
+        }
+
+    async def status(self):
+        size = sum(segment.size for segment in self._segments.values())
+        r = f"{len(self._runs)} runs in {len(self._segments)} segments, {size:_} B"
+        if self._rolled_segments:
+            r += f", {self._rolled_segments} segments rolled"
+        return r
+
+    async def __aenter__(self):
+        self._directory.mkdir(parents=True, exist_ok=True)
+        self._runs.clear()
+        self._byid.clear()
+        self._rollups.clear()
+        self._segments.clear()
+        numbers = sorted(int(it.stem) for it in self._directory.glob("*.seg"))
+        for number in numbers:
+            self._segments[number] = _Segment(number)
+            for entry in await asyncio.to_thread(self._recover, number):
+                self._index(entry)
+        self._open(numbers[-1] if numbers else 0)
+
+        if self.roll_nb_segments or self.roll_old_entries:
+            self._roller_stop.clear()
+            self._roller = asyncio.create_task(self._rolling())
+
+    async def __aexit__(self, *_):
+        if roller := self._roller:
+            self._roller_stop.set()
+            await asyncio.gather(roller, return_exceptions=True)
+            self._roller = None
+        async with self._writelock:
+            self._close()
+        with self._maplock:
+            for segment in self._segments.values():
+                segment.map = None
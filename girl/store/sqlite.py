@@ -1,14 +1,274 @@
 import asyncio
+import json
+import os
+import sqlite3
+import zlib
+from collections.abc import AsyncIterator
+from collections.abc import Callable
+from collections.abc import Iterable
+from contextlib import asynccontextmanager
 from datetime import datetime
 from datetime import timedelta
+from fnmatch import fnmatchcase
+from hashlib import sha256
+from logging import getLogger
 from pathlib import Path
 from sqlite3 import Connection
+from threading import Lock
+from threading import get_ident
+from time import perf_counter
+from time import time
 
 import aiosqlite
 
 from .base import Base
+from .base import DataReader
+from .base import Rollup
 from .base import RunInfoFull
+from .base import RunInfoLazy
 from .base import RunInfoPartial
+from .base import SearchHit
+from .base import _Histogram
+
+_logger = getLogger(__name__)
+
+# rows per query of `iterruns`
+_PAGE = 256
+
+# schema migrations, entry `n` brings a database from `PRAGMA user_version` n
+# to n+1; each is ran in its own transaction - only ever append to this list
+_MIGRATIONS = [
+    r"""
+ CREATE TABLE IF NOT EXISTS event_runs (
+    id    TEXT             NOT NULL, -- eg. "localhost:8080 GET /hi"
+    runid TEXT PRIMARY KEY NOT NULL, -- eg. "some-banana"
+    ts    REAL             NOT NULL,
+    tags  TEXT             NOT NULL) -- eg. "\ttag1\ttag2\t" or empty "\t\t"
+ STRICT, WITHOUT ROWID;
+
+ CREATE TABLE IF NOT EXISTS run_data (
+    runid TEXT             NOT NULL, -- eg. "some-banana"
+    key   TEXT             NOT NULL, -- eg. "*request-body*" or "/some/file"
+    ts    REAL             NOT NULL,
+    data  BLOB             NOT NULL,
+    FOREIGN KEY(runid) REFERENCES event_runs(runid),
+    PRIMARY KEY(runid, key))
+ STRICT, WITHOUT ROWID;
+
+ CREATE TABLE IF NOT EXISTS known_tags (
+    tag   TEXT PRIMARY KEY NOT NULL)
+ STRICT, WITHOUT ROWID;
+ """,
+    # content-addressed data: each distinct blob is stored once in `blobs`
+    # and `run_data` only refers to it by hash; this one is a rowid table
+    # because sqlite advises against large rows in WITHOUT ROWID tables
+    r"""
+ CREATE TABLE blobs (
+    hash  BLOB UNIQUE      NOT NULL, -- sha256(data)
+    refs  INTEGER          NOT NULL, -- nb of `run_data` rows with this hash
+    data  BLOB             NOT NULL)
+ STRICT;
+
+ CREATE INDEX blobs_unreferenced ON blobs(refs) WHERE refs <= 0;
+
+ INSERT INTO blobs (hash, refs, data)
+ SELECT sha256(data), count(*), data FROM run_data GROUP BY 1;
+
+ CREATE TABLE run_data_ (
+    runid TEXT             NOT NULL, -- eg. "some-banana"
+    key   TEXT             NOT NULL, -- eg. "*request-body*" or "/some/file"
+    ts    REAL             NOT NULL,
+    hash  BLOB             NOT NULL, -- see `blobs`
+    FOREIGN KEY(runid) REFERENCES event_runs(runid),
+    PRIMARY KEY(runid, key))
+ STRICT, WITHOUT ROWID;
+
+ INSERT INTO run_data_ SELECT runid, key, ts, sha256(data) FROM run_data;
+ DROP TABLE run_data;
+ ALTER TABLE run_data_ RENAME TO run_data;
+ """,
+    # name of the codec the data is encoded with, see `Store.codecs`
+    r"""
+ ALTER TABLE run_data ADD COLUMN codec TEXT NOT NULL DEFAULT '';
+ """,
+    # tags, one row each, for `listruns(any_tag=..)` to not scan every run;
+    # (`event_runs.tags` is kept as is to list runs without a join)
+    r"""
+ CREATE TABLE run_tags (
+    tag   TEXT             NOT NULL,
+    runid TEXT             NOT NULL, -- eg. "some-banana"
+    FOREIGN KEY(runid) REFERENCES event_runs(runid),
+    PRIMARY KEY(tag, runid))
+ STRICT, WITHOUT ROWID;
+
+ CREATE INDEX run_tags_runid ON run_tags(runid);
+
+ WITH RECURSIVE split(runid, tag, rest) AS (
+    SELECT runid, '', substr(tags, 2) FROM event_runs
+    UNION ALL
+    SELECT runid,
+           substr(rest, 1, instr(rest, char(9)) - 1),
+           substr(rest, instr(rest, char(9)) + 1)
+    FROM split WHERE '' != rest)
+ INSERT OR IGNORE INTO run_tags SELECT tag, runid FROM split WHERE '' != tag;
+ """,
+    # `listruns` is by (id, ts) range, rolling is by ts (see benchmarks/)
+    r"""
+ CREATE INDEX event_runs_id_ts ON event_runs(id, ts);
+ CREATE INDEX event_runs_ts ON event_runs(ts);
+ CREATE INDEX run_data_ts ON run_data(ts);
+ """,
+    # per handler aggregates, see `store.base.Rollup`; kept up to date when
+    # storing (rolling runs does not change them), compacted/expired apart
+    r"""
+ CREATE TABLE rollups (
+    id    TEXT             NOT NULL,
+    ts    REAL             NOT NULL, -- start of the bucket
+    width REAL             NOT NULL, -- 3600 (or 86400 once compacted)
+    runs  INTEGER          NOT NULL,
+    bytes INTEGER          NOT NULL,
+    keys  INTEGER          NOT NULL,
+    PRIMARY KEY(id, ts))
+ STRICT, WITHOUT ROWID;
+
+ CREATE TABLE rollup_tags (
+    id    TEXT             NOT NULL,
+    ts    REAL             NOT NULL,
+    tag   TEXT             NOT NULL,
+    runs  INTEGER          NOT NULL,
+    PRIMARY KEY(id, ts, tag))
+ STRICT, WITHOUT ROWID;
+
+ WITH runs AS (
+    SELECT id, runid, CAST(ts / 3600 AS INTEGER) * 3600.0 AS bucket,
+        (SELECT coalesce(sum(length(data)), 0) FROM run_data JOIN blobs USING (hash)
+            WHERE run_data.runid = event_runs.runid) AS bytes,
+        (SELECT count(*) FROM run_data
+            WHERE run_data.runid = event_runs.runid) AS keys
+    FROM event_runs)
+ INSERT INTO rollups
+ SELECT id, bucket, 3600.0, count(*), sum(bytes), sum(keys) FROM runs
+ GROUP BY id, bucket;
+
+ INSERT INTO rollup_tags
+ SELECT id, CAST(ts / 3600 AS INTEGER) * 3600.0 AS bucket, tag, count(*)
+ FROM run_tags JOIN event_runs USING (runid)
+ GROUP BY id, bucket, tag;
+ """,
+    # v7: how long and how well runs went (NULL for the ones from before)
+    r"""
+ ALTER TABLE event_runs ADD COLUMN duration REAL;
+ ALTER TABLE event_runs ADD COLUMN outcome  TEXT;
+ ALTER TABLE event_runs ADD COLUMN timings  TEXT NOT NULL DEFAULT '{}';
+
+ CREATE INDEX event_runs_failed ON event_runs(id, ts) WHERE outcome <> 'ok';
+ """,
+    # v8: for the full-text index, see `BackendSqlite.search`; the FTS5 table
+    # itself (`run_text`) is only created when enabled
+    r"""
+ CREATE TABLE search_pending (
+    runid TEXT PRIMARY KEY NOT NULL) -- stored but not yet indexed
+ STRICT, WITHOUT ROWID;
+
+ CREATE TABLE search_rows (
+    runid TEXT             NOT NULL,
+    row   INTEGER          NOT NULL, -- rowid in `run_text`
+    PRIMARY KEY(runid, row))
+ STRICT, WITHOUT ROWID;
+ """,
+    # v9: large blobs are in files named after their hash, see `sidecar_dir`;
+    # these have an empty `data` and their size here
+    r"""
+ ALTER TABLE blobs ADD COLUMN sidecar INTEGER;
+ """,
+]
+
+_RUN_TEXT = r"""
+ CREATE VIRTUAL TABLE run_text USING fts5(text, runid UNINDEXED, key UNINDEXED);
+ INSERT OR IGNORE INTO search_pending SELECT runid FROM event_runs;
+ """
+
+_HOUR = 3600.0
+_DAY = 86400.0
+
+# a sidecar file is written before the transaction that refers to it, so one
+# without its row is only removed once this old (in seconds)
+_SIDECAR_GRACE = 3600.0
+
+
+_SYNCHRONOUS = {"OFF", "NORMAL", "FULL", "EXTRA"}
+
+
+# a run waiting on group commit, see `group_commit_window`
+_Grouped = tuple[str, str, RunInfoFull, asyncio.Future[None]]
+
+
+def _sha256(data: bytes) -> bytes:
+    return sha256(data).digest()
+
+
+def _settle(group: list[_Grouped], e: BaseException | None):
+    for *_, fut in group:
+        if not fut.done():
+            fut.set_exception(e) if e else fut.set_result(None)
+
+
+class _BlobReader(DataReader):
+    __slots__ = ("_conn", "_lock", "_connect", "_hashes", "_sidecars")
+
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        lock: Lock,
+        connect: Callable[[], sqlite3.Connection],
+        hashes: dict[str, bytes],
+        sidecars: dict[str, Path],
+    ):
+        self._conn = conn
+        self._lock = lock
+        self._connect = connect
+        self._hashes = hashes
+        self._sidecars = sidecars
+
+    def _gone(self, key: str):
+        return LookupError(f"no data for {key!r} anymore (rolled since?)")
+
+    def read(self, key: str):
+        if path := self._sidecars.get(key):
+            return path.read_bytes()
+        # (a single statement run to its end, no snapshot is kept after it)
+        with self._lock:
+            all = self._conn.execute(
+                r"SELECT data FROM blobs WHERE ? = hash", (self._hashes[key],)
+            ).fetchall()
+        if not all:
+            raise self._gone(key)
+        return all[0][0]
+
+    def chunks(self, key: str, size: int):
+        if path := self._sidecars.get(key):
+            with path.open("rb") as f:
+                while chunk := f.read(size):
+                    yield chunk
+            return
+        # incremental blob i/o, only ever `size` bytes in memory at once; on a
+        # connection of its own, for the snapshot it holds to only be its own
+        conn = self._connect()
+        try:
+            conn.execute(r"BEGIN")
+            all = conn.execute(
+                r"SELECT rowid FROM blobs WHERE ? = hash", (self._hashes[key],)
+            ).fetchall()
+            if not all:
+                raise self._gone(key)
+            with conn.blobopen("blobs", "data", all[0][0], readonly=True) as b:
+                while chunk := b.read(size):
+                    yield chunk
+        finally:
+            conn.close()
+
+    def path(self, key: str):
+        return self._sidecars.get(key)
 
 
 class BackendSqlite(Base):
@@ -23,11 +283,47 @@ class BackendSqlite(Base):
         roll_nb_entries: int | None = None,
         # remove (lazily) entries older than this
         roll_old_entries: timedelta | None = None,
+        # same but per handler, the first fnmatch pattern matching the id
+        # wins over `roll_old_entries`; eg. `{"*/hook": timedelta(days=90)}`
+        roll_policies: dict[str, timedelta] | None = None,
         # vacuums when rolling and size is above this (in bytes);
         # only ever usefull in combination with one of the other `roll_`
-        # it will also ever run an actual VACUUM if it can actually
-        # reclaim enough to get below this size
+        # it is an incremental vacuum, which a database only supports if it
+        # was created by this (otherwise do a one time `VACUUM` beforehand)
         roll_vacuums_size: int | None = None,
+        # rolling happens in the background every so often (in seconds), and
+        # removes at most `roll_batch_size` runs (or pages) per transaction
+        roll_interval: float = 60,
+        roll_batch_size: int = 500,
+        # group commit: runs stored within this many seconds of each other
+        # are written in a single transaction (so a single fsync),
+        # at most `group_commit_size` runs per transaction
+        group_commit_window: float | None = None,
+        group_commit_size: int = 64,
+        # read-only connections for queries (they run alongside writes, WAL
+        # journaling is enabled for this); only if the database is a file
+        readers: int = 4,
+        # applied to every connection when given, see sqlite's PRAGMA doc;
+        # eg. `synchronous="NORMAL"` is durable enough with WAL
+        synchronous: str | None = None,
+        mmap_size: int | None = None,
+        cache_size: int | None = None,
+        # log statements that take longer than this (in seconds)
+        slow_query: float | None = None,
+        # when rolling, hourly rollups older than this are merged by day,
+        # and rollups older than `rollup_expire` are removed (if given)
+        rollup_compact_after: timedelta = timedelta(days=7),
+        rollup_expire: timedelta | None = None,
+        # full-text index (FTS5) of the runs' text data, filled in the
+        # background by batches of runs rather than when storing; data larger
+        # than `search_max_size` (as stored) is not indexed
+        search_index: bool = False,
+        search_max_size: int = 2**20,
+        search_batch_size: int = 64,
+        # data at least `sidecar_min_size` bytes (as stored) goes to a file
+        # in there named after its hash, rather than in the database
+        sidecar_dir: str | Path | None = None,
+        sidecar_min_size: int = 2**20,
     ):
         if isinstance(path_or_conn, Connection):
             self._path = None
@@ -49,58 +345,529 @@ class BackendSqlite(Base):
 
         self.roll_nb_entries = roll_nb_entries
         self.roll_old_entries = roll_old_entries
+        self.roll_policies = roll_policies or {}
         self.roll_vacuums_size = roll_vacuums_size
+        self.roll_interval = roll_interval
+        self.roll_batch_size = roll_batch_size
+        self._roller: asyncio.Task[None] | None = None
+        self._roller_stop = asyncio.Event()
+        # progress of rolling, see `status`
+        self._rolling_since: float | None = None
+        self._rolled_runs = 0
+        self._rolled_pages = 0
+        self._rolled_total = 0
+        self._roll_timings = _Histogram()
+
+        self.slow_query = slow_query
+        self._slow_queries = 0
+
+        self.rollup_compact_after = rollup_compact_after
+        self.rollup_expire = rollup_expire
+
+        self.search_index = search_index
+        self.search_max_size = search_max_size
+        self.search_batch_size = search_batch_size
+        # whether `run_text` exists, runs are queued for it even if `search_index`
+        # is now off, so they get indexed when it is back on
+        self._searchable = False
+        self._indexer: asyncio.Task[None] | None = None
+        self._indexer_stop = asyncio.Event()
+        self._indexer_wake = asyncio.Event()
+        self._indexed = 0
+        self._index_timings = _Histogram()
+
+        self.sidecar_dir = sidecar_dir and Path(sidecar_dir)
+        self.sidecar_min_size = sidecar_min_size
+        self._sidecars_removed = 0
+
+        self.group_commit_window = group_commit_window
+        self.group_commit_size = group_commit_size
+        self._group = list[_Grouped]()
+        self._group_full = asyncio.Event()
+        self._grouper: asyncio.Task[None] | None = None
+        self._group_loop: asyncio.AbstractEventLoop | None = None
+
+        if synchronous and synchronous.upper() not in _SYNCHRONOUS:
+            raise ValueError(f"unknown synchronous mode {synchronous!r}")
+        self.readers = readers
+        self.synchronous = synchronous
+        self.mmap_size = mmap_size
+        self.cache_size = cache_size
+        # `_conn` is the writer, queries go through `_reading` which picks
+        # from this pool (or falls back to `_conn` if there is none)
+        self._pool = list[aiosqlite.Connection]()
+        self._pool_free = asyncio.Queue[aiosqlite.Connection]()
+
+        # separate (sync, read-only) connection for lazily loaded runs, it
+        # can only exist if the database is an actual file
+        self._reader: sqlite3.Connection | None = None
+        self._reader_lock = Lock()
+        self._reader_uri = ""
+
+    def _connect_reader(self):
+        """blocking, a read-only connection (usable from any thread)"""
+        conn = sqlite3.connect(self._reader_uri, uri=True, check_same_thread=False)
+        if pragmas := self._pragmas(False):
+            conn.executescript(pragmas)
+        return conn
+
+    def _pragmas(self, writer: bool):
+        r = ""
+        if writer and self.synchronous:
+            r += f"PRAGMA synchronous = {self.synchronous.upper()};\n"
+        if self.mmap_size is not None:
+            r += f"PRAGMA mmap_size = {int(self.mmap_size)};\n"
+        if self.cache_size is not None:
+            r += f"PRAGMA cache_size = {int(self.cache_size)};\n"
+        return r
+
+    def _took(self, sql: str, start: float):
+        took = perf_counter() - start
+        if self.slow_query is not None and self.slow_query <= took:
+            self._slow_queries += 1
+            _logger.warning(f"slow query ({took:.3f}s): {' '.join(sql.split())}")
+
+    async def _fetchall(
+        self,
+        conn: aiosqlite.Connection,
+        sql: str,
+        params: tuple[object, ...] | dict[str, object] = (),
+    ):
+        start = perf_counter()
+        try:
+            return list(await conn.execute_fetchall(sql, params))
+        finally:
+            self._took(sql, start)
+
+    async def _executemany(self, sql: str, rows: Iterable[tuple[object, ...]]):
+        start = perf_counter()
+        try:
+            await self._conn.executemany(sql, rows)
+        finally:
+            self._took(sql, start)
+
+    async def _execute(self, sql: str, params: tuple[object, ...] = ()):
+        start = perf_counter()
+        try:
+            return await self._conn.execute(sql, params)
+        finally:
+            self._took(sql, start)
+
+    async def _executescript(self, sql: str):
+        start = perf_counter()
+        try:
+            await self._conn.executescript(sql)
+        finally:
+            self._took(sql, start)
+
+    async def _commit(self):
+        # (this is the fsync)
+        start = perf_counter()
+        try:
+            await self._conn.commit()
+        finally:
+            self._took("COMMIT", start)
+
+    @asynccontextmanager
+    async def _reading(self) -> AsyncIterator[aiosqlite.Connection]:
+        if not self._pool:
+            yield self._conn
+            return
+        conn = await self._pool_free.get()
+        try:
+            yield conn
+        finally:
+            self._pool_free.put_nowait(conn)
 
-    async def _roll_vacuum(self):
-        # we'll be deleting all entries before this ts (so by default none);
-        # the roll_.. by below do a `max(delts, ..)` meaning that whichever
-        # option makes it delete most prevail
-        delts = 0.0
-        also_vacuum = False
+    def _sidecar(self, hash: bytes):
+        if not self.sidecar_dir:
+            raise LookupError("data is in a sidecar file but there is no `sidecar_dir`")
+        name = hash.hex()
+        return self.sidecar_dir / name[:2] / name
 
-        if self.roll_nb_entries:
+    def _write_sidecars(self, sidecars: dict[bytes, bytes]):
+        """blocking, the ones that are not there already"""
+        for hash, data in sidecars.items():
+            path = self._sidecar(hash)
+            if path.exists():
+                continue
+            path.parent.mkdir(exist_ok=True)
+            tmp = path.with_name(f"{path.name}.{os.getpid()}.{get_ident()}.tmp")
+            with tmp.open("wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            tmp.replace(path)
+
+    def _unlink_sidecars(self, hashes: list[bytes]):
+        for hash in hashes:
+            self._sidecar(hash).unlink(True)
+        self._sidecars_removed += len(hashes)
+
+    async def _sweep_sidecars(self):
+        """removes sidecar files (old enough) that are not referred to"""
+        assert self.sidecar_dir
+        old = time() - _SIDECAR_GRACE
+
+        def listing():
+            r = list[Path]()
+            for path in self.sidecar_dir.glob("*/*"):
+                try:
+                    if path.stat().st_mtime < old:
+                        r.append(path)
+                except FileNotFoundError:
+                    pass
+            return r
+
+        paths = await asyncio.to_thread(listing)
+        while paths and not self._roller_stop.is_set():
+            batch, paths = paths[: self.roll_batch_size], paths[self.roll_batch_size :]
+            named = dict[bytes, Path]()
+            for path in batch:
+                if ".tmp" == path.suffix:
+                    # left over by a crash while writing it
+                    _logger.info(f"removing temporary sidecar {path.name}")
+                    path.unlink(True)
+                    continue
+                try:
+                    named[bytes.fromhex(path.name)] = path
+                except ValueError:
+                    pass  # (not ours)
+            marks = ", ".join("?" for _ in named)
+            # see comment at `__init__`, a file could be about to be used
+            async with self._store_grouping_lock:
+                used = await self._fetchall(
+                    self._conn,
+                    rf"SELECT hash FROM blobs WHERE sidecar IS NOT NULL AND hash IN ({marks})",
+                    tuple(named),
+                )
+                used = {named[hash] for hash, in used}
+                gone = [path for path in named.values() if path not in used]
+                for path in gone:
+                    _logger.info(f"removing orphan sidecar {path.name}")
+                    path.unlink(True)
+            self._sidecars_removed += len(gone)
+
+    async def _roll_batch(self, where: str, params: tuple[object, ...]) -> int:
+        # see comment at `__init__`, also lets `storerun`s go between batches
+        async with self._store_grouping_lock:
+            try:
+                all = await self._fetchall(
+                    self._conn,
+                    rf"SELECT runid FROM event_runs WHERE {where} ORDER BY ts LIMIT ?",
+                    (*params, self.roll_batch_size),
+                )
+                runids = [(runid,) for runid, in all]
+                await self._executemany(
+                    r"DELETE FROM run_tags WHERE ? = runid",
+                    runids,
+                )
+                # drop references first, then whichever blob is no longer used
+                await self._executemany(
+                    r"""
+ UPDATE blobs SET refs = refs - gone.n
+ FROM (SELECT hash, count(*) AS n FROM run_data WHERE ? = runid GROUP BY hash) AS gone
+ WHERE blobs.hash = gone.hash
+ """,
+                    runids,
+                )
+                await self._executemany(
+                    r"DELETE FROM run_data WHERE ? = runid",
+                    runids,
+                )
+                await self._executemany(
+                    r"DELETE FROM event_runs WHERE ? = runid",
+                    runids,
+                )
+                unused = await self._fetchall(
+                    self._conn,
+                    r"DELETE FROM blobs WHERE refs <= 0 RETURNING hash, sidecar",
+                )
+                if self._searchable:
+                    await self._executemany(
+                        r"""
+ DELETE FROM run_text WHERE rowid IN (SELECT row FROM search_rows WHERE ? = runid)
+ """,
+                        runids,
+                    )
+                    await self._executemany(
+                        r"DELETE FROM search_rows WHERE ? = runid",
+                        runids,
+                    )
+                    await self._executemany(
+                        r"DELETE FROM search_pending WHERE ? = runid",
+                        runids,
+                    )
+                await self._commit()
+            except BaseException:
+                await self._conn.rollback()
+                raise
+            # (still locked, a run being stored could need the same file)
+            if gone := [hash for hash, sidecar in unused if sidecar is not None]:
+                await asyncio.to_thread(self._unlink_sidecars, gone)
+        self._rolled_runs += len(runids)
+        self._forgot([runid for runid, in runids])
+        return len(runids)
+
+    async def _roll_until(self, where: str, params: tuple[object, ...]):
+        while not self._roller_stop.is_set():
+            if await self._roll_batch(where, params) < self.roll_batch_size:
+                break
+
+    async def _reclaim(self):
+        c = await self._execute(
+            r"""
+ SELECT page_count * page_size, freelist_count, auto_vacuum
+ FROM pragma_page_count(), pragma_page_size(),
+      pragma_freelist_count(), pragma_auto_vacuum()
+ """,
+        )
+        size, free, auto_vacuum = await c.fetchone() or (0, 0, 0)
+        if not self.roll_vacuums_size or size <= self.roll_vacuums_size:
+            return
+        if 2 != auto_vacuum:  # INCREMENTAL
+            _logger.warning("database not in incremental auto_vacuum, cannot shrink")
+            return
+
+        while 0 < free and not self._roller_stop.is_set():
+            step = min(free, self.roll_batch_size)
+            async with self._store_grouping_lock:
+                # (needs stepping through entirely, which `execute` does not)
+                await self._executescript(f"PRAGMA incremental_vacuum({step});")
+            free -= step
+            self._rolled_pages += step
+
+    async def _roll(self):
+        """one rolling pass, by batches"""
+        self._rolling_since = time()
+        self._rolled_runs = self._rolled_pages = 0
+        try:
             # if asked to roll on nb of entries, find the one that would leave
             # this many after (sort by ts desc, offset skip nb, limit take 1)
-            c = await self._conn.execute(
-                rf"""
- SELECT ts FROM event_runs ORDER BY ts DESC
- LIMIT 1 OFFSET {self.roll_nb_entries}
- """,
-                (),
+            nb_ts = 0.0
+            if self.roll_nb_entries:
+                c = await self._execute(
+                    r"SELECT ts FROM event_runs ORDER BY ts DESC LIMIT 1 OFFSET ?",
+                    (self.roll_nb_entries,),
+                )
+                # will not find any if there are less than nb entries total
+                if ts := await c.fetchone():
+                    nb_ts = float(ts[0])
+
+            now = datetime.now()
+            old_ts = (
+                (now - self.roll_old_entries).timestamp()
+                if self.roll_old_entries
+                else 0.0
             )
-            # will not find any if there are less than nb entries total
-            if ts := await c.fetchone():
-                delts = max(delts, float(ts[0]))
 
-        if self.roll_old_entries:
-            delts = max(delts, (datetime.now() - self.roll_old_entries).timestamp())
+            if not self.roll_policies:
+                if delts := max(nb_ts, old_ts):
+                    await self._roll_until(r"ts <= ?", (delts,))
+            else:
+                ids = await self._fetchall(
+                    self._conn, r"SELECT DISTINCT id FROM event_runs"
+                )
+                for (id,) in ids:
+                    policy = next(
+                        (
+                            old
+                            for pat, old in self.roll_policies.items()
+                            if fnmatchcase(id, pat)
+                        ),
+                        None,
+                    )
+                    # whichever option makes it delete most prevail
+                    delts = max(nb_ts, (now - policy).timestamp() if policy else old_ts)
+                    if delts:
+                        await self._roll_until(r"? = id AND ts <= ?", (id, delts))
 
-        if self.roll_vacuums_size and delts:
-            c = await self._conn.execute(
-                r"""
-     SELECT page_count * page_size as size, freelist_count
-     FROM pragma_page_count(), pragma_freelist_count(), pragma_page_size()
-     """,
-                (),
-            )
-            if size_free := await c.fetchone():
-                size, free = map(int, size_free)
-                also_vacuum = (
-                    self.roll_vacuums_size < size  # is too fat
-                    and size - free < self.roll_vacuums_size  # can reclaim enough
+            if self.sidecar_dir:
+                await self._sweep_sidecars()
+            await self._roll_rollups()
+            await self._reclaim()
+
+        finally:
+            self._rolling_since = None
+            self._rolled_total += self._rolled_runs
+            if self._rolled_runs or self._rolled_pages:
+                _logger.info(
+                    f"rolled {self._rolled_runs} runs, {self._rolled_pages} pages"
                 )
 
-        if delts:
-            await self._conn.executescript(
+    async def _roll_rollups(self):
+        now = time()
+        # whole days only, so that a day is never half hours half compacted
+        compact = (now - self.rollup_compact_after.total_seconds()) // _DAY * _DAY
+        expire = 0.0
+        if self.rollup_expire is not None:
+            expire = now - self.rollup_expire.total_seconds()
+        params = {"day": _DAY, "compact": compact, "expire": expire}
+        hourly = r"SELECT id, ts FROM rollups WHERE width < :day AND ts < :compact"
+        async with self._store_grouping_lock:
+            try:
+                # hours to compact, summed by day (without what is to expire)
+                sums = await self._fetchall(
+                    self._conn,
+                    r"""
+ SELECT id, CAST(ts / :day AS INTEGER) * :day AS d, :day, sum(runs), sum(bytes), sum(keys)
+ FROM rollups WHERE width < :day AND ts < :compact
+ GROUP BY id, d HAVING :expire < d + :day
+ """,
+                    params,
+                )
+                tags = await self._fetchall(
+                    self._conn,
+                    rf"""
+ SELECT id, CAST(ts / :day AS INTEGER) * :day AS d, tag, sum(runs)
+ FROM rollup_tags WHERE (id, ts) IN ({hourly})
+ GROUP BY id, d, tag HAVING :expire < d + :day
+ """,
+                    params,
+                )
+                gone = rf"{hourly} UNION SELECT id, ts FROM rollups WHERE ts + width <= :expire"
+                await self._execute(
+                    rf"DELETE FROM rollup_tags WHERE (id, ts) IN ({gone})",
+                    params,
+                )
+                await self._execute(
+                    rf"DELETE FROM rollups WHERE (id, ts) IN ({gone})",
+                    params,
+                )
+                await self._executemany(
+                    r"""
+ INSERT INTO rollups VALUES (?, ?, ?, ?, ?, ?)
+ ON CONFLICT (id, ts) DO UPDATE SET
+    width = excluded.width,
+    runs = runs + excluded.runs,
+    bytes = bytes + excluded.bytes,
+    keys = keys + excluded.keys
+ """,
+                    sums,
+                )
+                await self._executemany(
+                    r"""
+ INSERT INTO rollup_tags VALUES (?, ?, ?, ?)
+ ON CONFLICT (id, ts, tag) DO UPDATE SET runs = runs + excluded.runs
+ """,
+                    tags,
+                )
+                await self._commit()
+            except BaseException:
+                await self._conn.rollback()
+                raise
+
+    @staticmethod
+    def _texts(all: list[tuple[str, str, str, bytes]], max_size: int):
+        """blocking, the (text, runid, key) of the data that is text"""
+        r = list[tuple[str, str, str]]()
+        for runid, key, codec, data in all:
+            if "zlib" == codec:
+                try:
+                    data = zlib.decompressobj().decompress(data, max_size)
+                except zlib.error:
+                    continue
+            if b"\0" in data:
+                continue
+            try:
+                r.append((data.decode(), runid, key))
+            except UnicodeDecodeError:
+                # (maybe a character cut at `max_size`, but likely not text)
+                continue
+        return r
+
+    async def _index_batch(self) -> int:
+        """indexes the next batch of pending runs, gives how many"""
+        async with self._reading() as conn:
+            pending = await self._fetchall(
+                conn,
+                r"SELECT runid FROM search_pending LIMIT ?",
+                (self.search_batch_size,),
+            )
+            if not pending:
+                return 0
+            marks = ", ".join("?" for _ in pending)
+            # only codecs the backend knows of, see `Store.codecs`
+            all = await self._fetchall(
+                conn,
                 rf"""
- BEGIN;
- DELETE FROM event_runs WHERE ts <= ?;
- DELETE FROM run_data WHERE ts <= ?;
- COMMIT;
- {'VACUUM;' if also_vacuum else ''}
+ SELECT runid, key, codec, data FROM run_data JOIN blobs USING (hash)
+ WHERE runid IN ({marks}) AND codec IN ('', 'zlib') AND length(data) <= ?
+    AND sidecar IS NULL
  """,
-                (delts, delts),
+                (*(runid for runid, in pending), self.search_max_size),
             )
+        texts = await asyncio.to_thread(self._texts, all, self.search_max_size)
+
+        # see comment at `__init__`
+        async with self._store_grouping_lock:
+            try:
+                # (some could have been rolled since)
+                there = await self._fetchall(
+                    self._conn,
+                    rf"SELECT runid FROM event_runs WHERE runid IN ({marks})",
+                    tuple(runid for runid, in pending),
+                )
+                there = {runid for runid, in there}
+                texts = [it for it in texts if it[1] in there]
+                # rowids are chosen here to not need one query per row
+                c = await self._execute(r"SELECT max(rowid) FROM run_text")
+                (last,) = await c.fetchone() or (0,)
+                rows = [(k, *it) for k, it in enumerate(texts, (last or 0) + 1)]
+                await self._executemany(
+                    r"INSERT INTO run_text (rowid, text, runid, key) VALUES (?, ?, ?, ?)",
+                    rows,
+                )
+                await self._executemany(
+                    r"INSERT INTO search_rows VALUES (?, ?)",
+                    [(runid, row) for row, _, runid, _ in rows],
+                )
+                await self._executemany(
+                    r"DELETE FROM search_pending WHERE ? = runid",
+                    pending,
+                )
+                await self._commit()
+            except BaseException:
+                await self._conn.rollback()
+                raise
+        self._indexed += len(pending)
+        return len(pending)
+
+    async def _indexing(self):
+        while not self._indexer_stop.is_set():
+            self._indexer_wake.clear()
+            start = perf_counter()
+            try:
+                if n := await self._index_batch():
+                    self._index_timings.add(perf_counter() - start)
+            except Exception as e:
+                _logger.error("could not index for search", exc_info=e)
+                n = 0
+            # (caught up: wait for more runs to be stored)
+            if n < self.search_batch_size:
+                await self._indexer_wake.wait()
+
+    async def _rolling(self):
+        while not self._roller_stop.is_set():
+            start = perf_counter()
+            try:
+                await self._roll()
+                self._roll_timings.add(perf_counter() - start)
+            except Exception as e:
+                _logger.error("could not roll/vacuum", exc_info=e)
+            try:
+                await asyncio.wait_for(self._roller_stop.wait(), self.roll_interval)
+            except TimeoutError:
+                pass
+
+    @staticmethod
+    def _and_maybe_by_tag(sortags: list[str]) -> str:
+        # runids that have any of the tags come from the `run_tags` index,
+        # so this goes through as many rows as there are matches
+        if not sortags:
+            return ""
+        marks = ", ".join("?" for _ in sortags)
+        return f"AND runid IN (SELECT runid FROM run_tags WHERE tag IN ({marks}))"
 
     @staticmethod
     def _to_tagstr(tags: set[str]) -> str:
@@ -110,40 +877,255 @@ class BackendSqlite(Base):
     def _from_tagstr(tagstr: str) -> set[str]:
         return set(tagstr[1:-1].split("\t")) if 2 < len(tagstr) else set()
 
-    async def storerun(self, id: str, runid: str, run: RunInfoFull):
-        """"""
+    @staticmethod
+    def _meta(duration: float | None, outcome: str | None, timings: str):
+        return {
+            "duration": duration,
+            "outcome": outcome,
+            "timings": json.loads(timings),
+        }
+
+    def _prepare(self, batch: list[tuple[str, str, RunInfoFull]]):
+        """blocking, the rows of `run_data` (hashed) and sidecars (written)"""
+        rows = [
+            (runid, key, ts, _sha256(data), run.codecs.get(key, ""), data)
+            for _, runid, run in batch
+            for key, (ts, data) in run.data.items()
+        ]
+        sidecars = dict[bytes, bytes]()
+        if self.sidecar_dir:
+            sidecars = {
+                hash: data
+                for *_, hash, _, data in rows
+                if self.sidecar_min_size <= len(data)
+            }
+            self._write_sidecars(sidecars)
+        return rows, sidecars
+
+    async def _storebatch(self, batch: list[tuple[str, str, RunInfoFull]]):
+        # (most of the work is done without holding the lock)
+        rows, sidecars = await asyncio.to_thread(self._prepare, batch)
+
         # see comment at `__init__`
         async with self._store_grouping_lock:
-            await self._conn.execute(
-                r"INSERT INTO event_runs VALUES (?, ?, ?, ?)",
-                (id, runid, run.ts, self._to_tagstr(run.tags)),
-            )
-            await self._conn.executemany(
-                r"INSERT INTO run_data VALUES (?, ?, ?, ?)",
-                [(runid, key, ts, data) for key, (ts, data) in run.data.items()],
+            try:
+                if sidecars:
+                    # rolling could have removed one in the meantime
+                    await asyncio.to_thread(self._write_sidecars, sidecars)
+                await self._executemany(
+                    r"INSERT INTO event_runs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (
+                            id,
+                            runid,
+                            run.ts,
+                            self._to_tagstr(run.tags),
+                            run.duration,
+                            run.outcome,
+                            json.dumps(run.timings),
+                        )
+                        for id, runid, run in batch
+                    ],
+                )
+                await self._executemany(
+                    r"""
+ INSERT INTO blobs VALUES (?, 1, ?, ?)
+ ON CONFLICT (hash) DO UPDATE SET refs = refs + 1
+ """,
+                    [
+                        (
+                            (hash, b"", len(data))
+                            if hash in sidecars
+                            else (hash, data, None)
+                        )
+                        for *_, hash, _, data in rows
+                    ],
+                )
+                await self._executemany(
+                    r"INSERT INTO run_data VALUES (?, ?, ?, ?, ?)",
+                    [row[:5] for row in rows],
+                )
+                await self._executemany(
+                    r"INSERT INTO run_tags VALUES (?, ?)",
+                    [(tag, runid) for _, runid, run in batch for tag in run.tags],
+                )
+                await self._executemany(
+                    r"INSERT INTO known_tags VALUES (?) ON CONFLICT DO NOTHING",
+                    [(tag,) for tag in set[str]().union(*(r.tags for *_, r in batch))],
+                )
+                buckets = [(id, run.ts // _HOUR * _HOUR, run) for id, _, run in batch]
+                await self._executemany(
+                    r"""
+ INSERT INTO rollups VALUES (?, ?, ?, 1, ?, ?)
+ ON CONFLICT (id, ts) DO UPDATE SET
+    runs = runs + 1,
+    bytes = bytes + excluded.bytes,
+    keys = keys + excluded.keys
+ """,
+                    [
+                        (
+                            id,
+                            ts,
+                            _HOUR,
+                            sum(len(data) for _, data in run.data.values()),
+                            len(run.data),
+                        )
+                        for id, ts, run in buckets
+                    ],
+                )
+                await self._executemany(
+                    r"""
+ INSERT INTO rollup_tags VALUES (?, ?, ?, 1)
+ ON CONFLICT (id, ts, tag) DO UPDATE SET runs = runs + 1
+ """,
+                    [(id, ts, tag) for id, ts, run in buckets for tag in run.tags],
+                )
+                if self._searchable:
+                    await self._executemany(
+                        r"INSERT INTO search_pending VALUES (?)",
+                        [(runid,) for _, runid, _ in batch],
+                    )
+                await self._commit()
+            except BaseException:
+                # all or nothing: none of the batch's runs made it
+                await self._conn.rollback()
+                raise
+        self._indexer_wake.set()
+
+    async def _group_commit(self):
+        group = None
+        try:
+            try:
+                await asyncio.wait_for(
+                    self._group_full.wait(), self.group_commit_window
+                )
+            except TimeoutError:
+                pass
+            group, self._group = self._group, []
+            self._group_full.clear()
+            self._grouper = None
+            await self._storegroup(group)
+        except BaseException as e:
+            # whatever happened, no run is left waiting on its future
+            if group is None:
+                group, self._group = self._group, []
+                self._group_full.clear()
+                self._grouper = None
+            _settle(group, e)
+
+    async def _storegroup(self, group: list[_Grouped]):
+        try:
+            await self._storebatch([(id, runid, run) for id, runid, run, _ in group])
+        except Exception as e:
+            if 1 == len(group):
+                return _settle(group, e)
+            # (rolled back) again one by one, so only the failing runs raise
+            for k, (id, runid, run, _) in enumerate(group):
+                try:
+                    await self._storebatch([(id, runid, run)])
+                except Exception as one:
+                    _settle(group[k : k + 1], one)
+                except BaseException as one:
+                    return _settle(group[k:], one)
+                else:
+                    _settle(group[k : k + 1], None)
+        except BaseException as e:
+            _settle(group, e)
+        else:
+            _settle(group, None)
+
+    async def storerun(self, id: str, runid: str, run: RunInfoFull):
+        """"""
+        # not grouped from an other loop (eg. `procs.doevent` thread): the
+        # grouper and its event belong to the loop this was entered on
+        loop = asyncio.get_running_loop()
+        if self.group_commit_window is None or loop is not self._group_loop:
+            return await self._storebatch([(id, runid, run)])
+
+        fut = loop.create_future()
+        self._group.append((id, runid, run, fut))
+        if self.group_commit_size <= len(self._group):
+            self._group_full.set()
+        if self._grouper is None:
+            self._grouper = asyncio.create_task(self._group_commit())
+        # raises if this run could not be stored (not for the rest of its group)
+        await fut
+
+    async def storeruns(self, batch: list[tuple[str, str, RunInfoFull]]):
+        """"""
+        await self._storebatch(batch)
+
+    async def loadrun(self, runid: str):
+        """"""
+        async with self._reading() as conn:
+            one = await self._fetchall(
+                conn,
+                r"""
+ SELECT ts, tags, duration, outcome, timings FROM event_runs WHERE ? = runid
+ """,
+                (runid,),
             )
-            await self._conn.executemany(
-                r"INSERT INTO known_tags VALUES (?) ON CONFLICT DO NOTHING",
-                [(tag,) for tag in run.tags],
+            if not one:
+                raise LookupError(f"no run for {runid!r}")
+            ((ts, tagstr, *meta),) = one
+            all = await self._fetchall(
+                conn,
+                r"""
+ SELECT key, ts, codec, data, hash, sidecar FROM run_data JOIN blobs USING (hash)
+ WHERE ? = runid ORDER BY ts
+ """,
+                (runid,),
             )
-            await self._conn.commit()
-            await self._roll_vacuum()
+        data = dict[str, tuple[float, bytes]]()
+        for key, kts, _, it, hash, sidecar in all:
+            if sidecar is not None:
+                it = await asyncio.to_thread(self._sidecar(hash).read_bytes)
+            data[key] = kts, it
+        codecs = {key: codec for key, _, codec, *_ in all if codec}
+        tags = self._from_tagstr(tagstr)
+        return RunInfoFull(ts, runid, tags, data, codecs, **self._meta(*meta))
 
-    async def loadrun(self, runid: str):
+    async def loadrunlazy(self, runid: str):
         """"""
-        c = await self._conn.execute(
-            r"SELECT ts, tags FROM event_runs WHERE ? = runid",
-            (runid,),
-        )
-        if (one := await c.fetchone()) is None:
-            raise LookupError(f"no run for {id!r} {runid!r}")
-        ts, tagstr = one
-        all = await self._conn.execute_fetchall(
-            r"SELECT key, ts, data FROM run_data WHERE ? = runid ORDER BY ts",
-            (runid,),
+        if not self._reader:
+            return await super().loadrunlazy(runid)
+
+        async with self._reading() as conn:
+            one = await self._fetchall(
+                conn,
+                r"""
+ SELECT ts, tags, duration, outcome, timings FROM event_runs WHERE ? = runid
+ """,
+                (runid,),
+            )
+            if not one:
+                raise LookupError(f"no run for {runid!r}")
+            ((ts, tagstr, *meta),) = one
+            # (`length` on a blob does not need to read its content)
+            all = await self._fetchall(
+                conn,
+                r"""
+ SELECT key, ts, codec, coalesce(sidecar, length(data)), hash, sidecar
+ FROM run_data JOIN blobs USING (hash)
+ WHERE ? = runid ORDER BY ts
+ """,
+                (runid,),
+            )
+        sizes = {key: (ts, size) for key, ts, _, size, *_ in all}
+        codecs = {key: codec for key, _, codec, *_ in all if codec}
+        reader = _BlobReader(
+            self._reader,
+            self._reader_lock,
+            self._connect_reader,
+            {key: hash for key, *_, hash, _ in all},
+            {
+                key: self._sidecar(hash)
+                for key, *_, hash, sidecar in all
+                if sidecar is not None
+            },
         )
-        data = {key: (ts, data) for key, ts, data in all}
-        return RunInfoFull(ts, runid, self._from_tagstr(tagstr), data)
+        tags = self._from_tagstr(tagstr)
+        return RunInfoLazy(ts, runid, tags, sizes, codecs, reader, **self._meta(*meta))
 
     async def listruns(
         self,
@@ -152,82 +1134,252 @@ class BackendSqlite(Base):
         min_ts: float,
         max_ts: float,
         any_tag: set[str],
+        min_duration: float | None = None,
+        failed_only: bool = False,
     ):
         """"""
-        # we insert user input in a 'LIKE' operand, so it's important to
-        # escape '%' and '_'; i used '!' just because (\\\\ could be confusing)
-        # using 'LIKE' means we get the unwanted ci, hence the pragma in aenter
-        sortags = sorted(
-            t.translate({ord("!"): "!!", ord("%"): "!%", ord("_"): "!_"})
-            for t in any_tag
-        )
-        and_maybe_by_tag = (
-            "AND ("
-            + " OR ".join("tags LIKE '%\t'||?||'\t%' ESCAPE '!'" for _ in sortags)
-            + ")"
-            if any_tag
-            else ""
-        )
-        all = await self._conn.execute_fetchall(
-            rf"""
- SELECT ts, runid, tags FROM event_runs
+        sortags = sorted(any_tag)
+        and_maybe_by_tag = self._and_maybe_by_tag(sortags)
+        params = [id, min_ts, max_ts, *sortags]
+        if min_duration is not None:
+            and_maybe_by_tag += " AND duration >= ?"
+            params.append(min_duration)
+        if failed_only:
+            # (same condition as the partial index `event_runs_failed`)
+            and_maybe_by_tag += " AND outcome <> 'ok'"
+        async with self._reading() as conn:
+            all = await self._fetchall(
+                conn,
+                rf"""
+ SELECT ts, runid, tags, duration, outcome, timings FROM event_runs
  WHERE ? = id AND ts BETWEEN ? AND ? {and_maybe_by_tag}
  ORDER BY ts
  """,
-            (id, min_ts, max_ts, *sortags),
-        )
+                tuple(params),
+            )
         return [
-            RunInfoPartial(ts, runid, self._from_tagstr(tagstr))
-            for ts, runid, tagstr in all
+            RunInfoPartial(ts, runid, self._from_tagstr(tagstr), **self._meta(*meta))
+            for ts, runid, tagstr, *meta in all
         ]
 
+    async def iterruns(
+        self,
+        id: str,
+        *,
+        min_ts: float,
+        max_ts: float,
+        any_tag: set[str],
+        after: tuple[float, str] | None = None,
+        limit: int | None = None,
+        descending: bool = False,
+    ):
+        """"""
+        sortags = sorted(any_tag)
+        and_maybe_by_tag = self._and_maybe_by_tag(sortags)
+        cmp, order = ("<", "DESC") if descending else (">", "ASC")
+        # keyset pagination: each page is its own (short) query starting
+        # right after the last row of the previous one; (id, ts) index
+        # implicitly ends with runid (the primary key) so no sorting needed
+        while limit is None or 0 < limit:
+            page = _PAGE if limit is None else min(limit, _PAGE)
+            and_after = f"AND (ts, runid) {cmp} (?, ?)" if after else ""
+            # (a connection is only held for a page, not across yields)
+            async with self._reading() as conn:
+                all = await self._fetchall(
+                    conn,
+                    rf"""
+ SELECT ts, runid, tags, duration, outcome, timings FROM event_runs
+ WHERE ? = id AND ts BETWEEN ? AND ? {and_maybe_by_tag} {and_after}
+ ORDER BY ts {order}, runid {order} LIMIT ?
+ """,
+                    (id, min_ts, max_ts, *sortags, *(after or ()), page),
+                )
+            for ts, runid, tagstr, *meta in all:
+                tags = self._from_tagstr(tagstr)
+                yield RunInfoPartial(ts, runid, tags, **self._meta(*meta))
+            if len(all) < page:
+                break
+            after = all[-1][0], all[-1][1]
+            if limit is not None:
+                limit -= len(all)
+
     async def knowntags(self):
-        all = await self._conn.execute_fetchall("SELECT tag FROM known_tags")
+        async with self._reading() as conn:
+            all = await self._fetchall(conn, "SELECT tag FROM known_tags")
         return set(str(t) for t, in all)
 
+    async def search(
+        self,
+        query: str,
+        *,
+        ids: list[str] | None = None,
+        limit: int = 100,
+    ):
+        """"""
+        if not self._searchable:
+            raise NotImplementedError("no full-text index, see `search_index`")
+        and_maybe_by_id = ""
+        if ids is not None:
+            marks = ", ".join("?" for _ in ids)
+            and_maybe_by_id = f"AND id IN ({marks})"
+        async with self._reading() as conn:
+            all = await self._fetchall(
+                conn,
+                rf"""
+ SELECT id, runid, ts, key, snippet(run_text, 0, '[', ']', '...', 16)
+ FROM run_text JOIN event_runs USING (runid)
+ WHERE run_text MATCH ? {and_maybe_by_id}
+ ORDER BY rank LIMIT ?
+ """,
+                (query, *(ids or ()), limit),
+            )
+        return [SearchHit(*it) for it in all]
+
+    async def rollups(self, id: str, *, min_ts: float, max_ts: float):
+        # (compacted buckets are at most a day wide)
+        params = id, min_ts - _DAY, max_ts
+        async with self._reading() as conn:
+            all = await self._fetchall(
+                conn,
+                r"""
+ SELECT ts, width, runs, bytes, keys FROM rollups
+ WHERE ? = id AND ts BETWEEN ? AND ? ORDER BY ts
+ """,
+                params,
+            )
+            tags = await self._fetchall(
+                conn,
+                r"SELECT ts, tag, runs FROM rollup_tags WHERE ? = id AND ts BETWEEN ? AND ?",
+                params,
+            )
+        r = {ts: Rollup(ts, *rest) for ts, *rest in all if min_ts < ts + rest[0]}
+        for ts, tag, n in tags:
+            if it := r.get(ts):
+                it.tags[tag] = n
+        return list(r.values())
+
     async def status(self):
-        c = await self._conn.execute(
+        c = await self._execute(
             r"""
  SELECT (page_count - freelist_count) * page_size as size
  FROM pragma_page_count(), pragma_freelist_count(), pragma_page_size()
  """,
             (),
         )
-        return f"{int((await c.fetchone() or (0,))[0]):_} B"
+        r = f"{int((await c.fetchone() or (0,))[0]):_} B"
+        if self._rolling_since:
+            since = datetime.fromtimestamp(self._rolling_since)
+            r += f", rolling since {since:%X} ({self._rolled_runs} runs so far)"
+        elif self._roller:
+            r += f", {self._rolled_total} runs rolled"
+        return r
+
+    def metrics(self):
+        return {
+            "roll": self._roll_timings.asdict(),
+            "rolled": self._rolled_total,
+            "slow_queries": self._slow_queries,
+            "readers": len(self._pool),
+            "readers_free": self._pool_free.qsize(),
+            "index": self._index_timings.asdict(),
+            "indexed": self._indexed,
+            "sidecars_removed": self._sidecars_removed,
+        }
+
+    async def _migrate(self):
+        c = await self._execute(r"PRAGMA user_version")
+        (version,) = await c.fetchone() or (0,)
+        if len(_MIGRATIONS) < version:
+            raise RuntimeError(f"database schema version {version} is too recent")
+
+        for version, script in enumerate(_MIGRATIONS[version:], version + 1):
+            _logger.info(f"migrating database schema to version {version}")
+            try:
+                # (immediate: other connections wait, do not half-see it)
+                await self._executescript(
+                    f"BEGIN IMMEDIATE;\n{script}\n"
+                    f"PRAGMA user_version = {version};\nCOMMIT;"
+                )
+            except BaseException:
+                await self._conn.rollback()
+                raise
 
     async def __aenter__(self):
+        self._group_loop = asyncio.get_running_loop()
         self._conn = await (aiosqlite.connect(self._path) if self._path else self._conn)
-        await self._conn.executescript(
-            r"""
- PRAGMA case_sensitive_like = true; -- see `list_runs`
+        await self._conn.create_function("sha256", 1, _sha256, deterministic=True)
+        # only has an effect on a new database, see `roll_vacuums_size`
+        await self._execute(r"PRAGMA auto_vacuum = INCREMENTAL")
+        if pragmas := self._pragmas(True):
+            await self._executescript(pragmas)
 
- BEGIN;
+        await self._migrate()
 
- CREATE TABLE IF NOT EXISTS event_runs (
-    id    TEXT             NOT NULL, -- eg. "localhost:8080 GET /hi"
-    runid TEXT PRIMARY KEY NOT NULL, -- eg. "some-banana"
-    ts    REAL             NOT NULL,
-    tags  TEXT             NOT NULL) -- eg. "\ttag1\ttag2\t" or empty "\t\t"
- STRICT, WITHOUT ROWID;
+        c = await self._execute(
+            r"SELECT count(*) FROM sqlite_schema WHERE 'run_text' = name"
+        )
+        self._searchable = bool((await c.fetchone() or (0,))[0])
+        if self.search_index and not self._searchable:
+            _logger.info("creating full-text index, every run will be indexed")
+            await self._executescript(f"BEGIN;\n{_RUN_TEXT}\nCOMMIT;")
+            self._searchable = True
 
- CREATE TABLE IF NOT EXISTS run_data (
-    runid TEXT             NOT NULL, -- eg. "some-banana"
-    key   TEXT             NOT NULL, -- eg. "*request-body*" or "/some/file"
-    ts    REAL             NOT NULL,
-    data  BLOB             NOT NULL,
-    FOREIGN KEY(runid) REFERENCES event_runs(runid),
-    PRIMARY KEY(runid, key))
- STRICT, WITHOUT ROWID;
+        c = await self._execute(
+            r"SELECT file FROM pragma_database_list WHERE 'main' = name"
+        )
+        if file := str((await c.fetchone() or ("",))[0]):
+            # readers do not block the writer nor the other way around
+            await self._executescript(r"PRAGMA journal_mode = WAL;")
+            uri = f"{Path(file).as_uri()}?mode=ro"
+            pragmas = self._pragmas(False)
+            for _ in range(self.readers):
+                conn = await aiosqlite.connect(uri, uri=True)
+                if pragmas:
+                    await conn.executescript(pragmas)
+                self._pool.append(conn)
+                self._pool_free.put_nowait(conn)
+            self._reader_uri = uri
+            self._reader = self._connect_reader()
 
- CREATE TABLE IF NOT EXISTS known_tags (
-    tag   TEXT PRIMARY KEY NOT NULL)
- STRICT, WITHOUT ROWID;
+        if self.sidecar_dir:
+            self.sidecar_dir.mkdir(parents=True, exist_ok=True)
 
- COMMIT;
- """,
-        )
+        if (
+            self.roll_nb_entries
+            or self.roll_old_entries
+            or self.roll_policies
+            or self.rollup_expire
+            or self.sidecar_dir
+        ):
+            self._roller_stop.clear()
+            self._roller = asyncio.create_task(self._rolling())
+
+        if self.search_index:
+            self._indexer_stop.clear()
+            self._indexer = asyncio.create_task(self._indexing())
 
     async def __aexit__(self, *_):
+        # lets the ongoing rolling batch finish but not start any new one
+        if roller := self._roller:
+            self._roller_stop.set()
+            await asyncio.gather(roller, return_exceptions=True)
+            self._roller = None
+        if indexer := self._indexer:
+            self._indexer_stop.set()
+            self._indexer_wake.set()
+            await asyncio.gather(indexer, return_exceptions=True)
+            self._indexer = None
         # make sure pending worlds have been able to storerun properly
+        if grouper := self._grouper:
+            self._group_full.set()
+            await asyncio.gather(grouper, return_exceptions=True)
         async with self._store_grouping_lock:
             await self._conn.close()
+        for conn in self._pool:
+            await conn.close()
+        self._pool.clear()
+        self._pool_free = asyncio.Queue()
+        if self._reader:
+            with self._reader_lock:
+                self._reader.close()
+            self._reader = None
@@ -1,4 +1,6 @@
 import json
+from collections.abc import AsyncIterator
+from hashlib import sha256
 from logging import getLogger
 from pathlib import PurePath
 from types import TracebackType
@@ -12,6 +14,8 @@ import aiohttp
 from coolname import generate_slug
 
 from . import app
+from .runids import alias
+from .runids import ulid
 
 _logger = getLogger(__name__)
 
@@ -65,7 +69,14 @@ class World:
         self.app = app
 
         self.id = id
-        self.runid = runid or generate_slug(app.settings.get("slug_pattern"))
+        if runid is None:
+            if make := app.settings.get("runid"):
+                runid = make()
+            elif "slug_pattern" in app.settings:
+                runid = generate_slug(app.settings["slug_pattern"])
+            else:
+                runid = ulid()
+        self.runid = runid
         self._pacifier = pacifier
 
         self.file = _WorldFileProxy(self)
@@ -75,6 +86,11 @@ class World:
         await self.app.store.beginrun(self)
         return self
 
+    @property
+    def alias(self):
+        """human friendly name of the run, see `runids.alias`"""
+        return alias(self.runid)
+
     def tag(self, *tags: str):
         """add a tag to the run"""
         if not self._pacifier:
@@ -93,7 +109,7 @@ class World:
     ):
         if self.web._inner is not None:
             await self.web._inner.close()
-        await self.app.store.finishrun(self)
+        await self.app.store.finishrun(self, exc_value)
 
     def __repr__(self):
         return f"<world {self.id!r} {self.runid!r}>"
@@ -123,9 +139,9 @@ class _WorldWebProxy:
         self._inner = None
 
     def _sess(self):
+        # (closing it in `World.__aexit__` leaves the app's connections open)
         if self._inner is None:
-            se = self._world.app.settings.get("world_web") or {}
-            self._inner = aiohttp.ClientSession(**se)
+            self._inner = self._world.app._session()
         return self._inner
 
     @_proxies(aiohttp.ClientSession.request)
@@ -140,7 +156,9 @@ class _WorldWebProxy:
                 **kwargs,
             )
         else:
-            (await self._sess().request(method, url, **kwargs)).close()
+            # (read through so that the connection can be reused)
+            async with self._sess().request(method, url, **kwargs) as r:
+                await r.read()
 
     @_proxies(aiohttp.ClientSession.request)
     async def request_bytes(self, method: ..., url: ..., **kwargs: ...) -> bytes:
@@ -154,8 +172,9 @@ class _WorldWebProxy:
             )
             return b"" if data is None else await data
 
-        async with self._sess().request(method, url, **kwargs) as r:
-            data = await r.read()
+        with self._world.app.store.tracking(self._world, "request_bytes"):
+            async with self._sess().request(method, url, **kwargs) as r:
+                data = await r.read()
 
         params = json.dumps(kwargs).encode()
         self._world.app.store.store(self._world, f"{method} {url} *params*", params)
@@ -163,6 +182,61 @@ class _WorldWebProxy:
 
         return data
 
+    async def request_stream(
+        self,
+        method: str,
+        url: str,
+        *,
+        chunk_size: int = 2**16,
+        max_record: int | None = None,
+        **kwargs: ...,
+    ) -> AsyncIterator[bytes]:
+        """
+        the body by chunks, each recorded as it comes (see `Store.spill_dir`
+        for them not to stay in memory); past `max_record` bytes, only the
+        size and sha256 of the body are (0 for only these)
+
+        replaying gives the recorded chunks, then raises `LookupError` if the
+        body was not recorded in full; use `contextlib.aclosing` if not going
+        through all of it, so it is recorded before the run ends
+        """
+        store = self._world.app.store
+        base = f"{method} {url}"
+        if self._world._pacifier and not self._world._pacifier.is_new:
+            end = json.loads(store.load(self._world, f"{base} *stream*"))
+            for _ in range(end["chunks"]):
+                yield store.load(self._world, f"{base} *chunk*")
+            if end["recorded"] < end["size"]:
+                raise LookupError(
+                    f"only {end['recorded']} of {end['size']} bytes recorded for {base!r}"
+                )
+            return
+
+        params = json.dumps(kwargs).encode()
+        store.store(self._world, f"{base} *params*", params)
+        hash = sha256()
+        size = recorded = chunks = 0
+        try:
+            async with self._sess().request(method, url, **kwargs) as r:
+                async for chunk in r.content.iter_chunked(chunk_size):
+                    size += len(chunk)
+                    hash.update(chunk)
+                    if max_record is None or recorded < max_record:
+                        if max_record is not None:
+                            part = chunk[: max_record - recorded]
+                        else:
+                            part = chunk
+                        store.store(self._world, f"{base} *chunk*", part)
+                        recorded += len(part)
+                        chunks += 1
+                    yield chunk
+        finally:
+            # (also when the handler stops early, what it got is recorded)
+            end = dict(
+                size=size, sha256=hash.hexdigest(), chunks=chunks, recorded=recorded
+            )
+            store.store(self._world, f"{base} *stream*", json.dumps(end).encode())
+
     @_proxies(aiohttp.ClientSession.request)
     async def request_text(self, method: ..., url: ..., **kwargs: ...):
         return (await self.request_bytes(method, url, **kwargs)).decode()
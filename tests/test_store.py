@@ -0,0 +1,839 @@
+import asyncio
+import json
+import os
+import sqlite3
+import zlib
+from datetime import datetime
+from datetime import timedelta
+from pathlib import Path
+
+from pytest import mark
+from pytest import raises
+
+from girl import App
+from girl import World
+from girl.extra import procs
+from girl.store import BackendMemory
+from girl.store import BackendSegments
+from girl.store import BackendSqlite
+from girl.store import BackendSqlitePartitioned
+from girl.store import Store
+from girl.store.base import RunInfoFull
+from girl.store.base import RunInfoPartial
+
+
+class _SlowMemory(BackendMemory):
+    def __init__(self):
+        super().__init__()
+        self.gate = asyncio.Event()
+
+    async def storerun(self, *a: ...):
+        await self.gate.wait()
+        await super().storerun(*a)
+
+
+async def _run(app: App, id: str, **data: bytes):
+    async with World(app, id, None) as world:
+        for key, it in data.items():
+            app.store.store(world, key, it)
+    return world.runid
+
+
+@mark.parametrize("durability", ["enqueue", "commit"])
+def test_write_behind(durability: ...):
+    async def inner():
+        backend = _SlowMemory()
+        app = App(Store(backend, write_behind=2, durability=durability))
+        async with app.store:
+            task = asyncio.create_task(_run(app, "id", a=b"a"))
+            await asyncio.sleep(0.01)
+            # only acknowledged before the commit when asked so
+            assert task.done() == ("enqueue" == durability)
+            backend.gate.set()
+            runid = await task
+        # exiting drained the queue
+        assert (await backend.loadrun(runid)).data["a"][1] == b"a"
+
+    asyncio.run(inner())
+
+
+def test_write_behind_backpressure():
+    async def inner():
+        backend = _SlowMemory()
+        app = App(Store(backend, write_behind=1, durability="enqueue"))
+        async with app.store:
+            tasks = [asyncio.create_task(_run(app, "id")) for _ in range(3)]
+            await asyncio.sleep(0.01)
+            # one being flushed, one queued, the last one waiting
+            assert [t.done() for t in tasks] == [True, True, False]
+            backend.gate.set()
+            await asyncio.gather(*tasks)
+        assert len(backend._runs) == 3
+
+    asyncio.run(inner())
+
+
+def test_sqlite_group_commit():
+    async def inner():
+        backend = BackendSqlite(":memory:", group_commit_window=0.05)
+        batches = list[int]()
+        storebatch = backend._storebatch
+
+        async def spy(batch: ...):
+            batches.append(len(batch))
+            await storebatch(batch)
+
+        backend._storebatch = spy
+        async with backend:
+            run = lambda runid: RunInfoFull(0, runid, {"t"}, {"k": (0, b"")})
+            await asyncio.gather(*(backend.storerun("id", r, run(r)) for r in "abc"))
+            assert batches == [3]
+
+            # a failing batch is retried run by run, only the failing ones raise
+            batches.clear()
+            r = await asyncio.gather(
+                backend.storerun("id", "d", run("d")),
+                backend.storerun("id", "a", run("a")),
+                backend.storerun("id", "e", run("e")),
+                return_exceptions=True,
+            )
+            assert r[0] is None and r[2] is None
+            assert isinstance(r[1], sqlite3.IntegrityError)
+            assert batches == [3, 1, 1, 1]
+            assert (await backend.loadrun("d")).runid == "d"
+            assert (await backend.loadrun("e")).runid == "e"
+
+            # on its own, no retrying
+            batches.clear()
+            with raises(sqlite3.IntegrityError):
+                await backend.storerun("id", "a", run("a"))
+            assert batches == [1]
+
+        # a run finished on an other loop (eg. `procs.doevent`) is not grouped
+        store = Store(BackendSqlite(":memory:", group_commit_window=0.01))
+        app = App(store)
+        async with store:
+            await _run(app, "id")
+            elsewhere = lambda: asyncio.run(_run(app, "id", k=b"k"))
+            runid = await asyncio.wait_for(asyncio.to_thread(elsewhere), 5)
+            assert (await store.loadrun(runid)).data["k"][1] == b"k"
+
+    asyncio.run(inner())
+
+
+def test_sqlite_dedup():
+    async def inner():
+        backend = BackendSqlite(":memory:", roll_nb_entries=2)
+        async with backend:
+            run = lambda ts, data: RunInfoFull(ts, "", set(), data)
+            await backend.storerun(
+                "id", "a", run(1, {"k": (1, b"same"), "l": (1, b"a")})
+            )
+            await backend.storerun(
+                "id", "b", run(2, {"k": (2, b"same"), "l": (2, b"b")})
+            )
+            assert (await backend.loadrun("a")).data == {
+                "k": (1, b"same"),
+                "l": (1, b"a"),
+            }
+
+            c = await backend._conn.execute(
+                "SELECT refs, data FROM blobs ORDER BY data"
+            )
+            assert await c.fetchall() == [(1, b"a"), (1, b"b"), (2, b"same")]
+
+            # rolling out "a" only frees what nothing else references
+            await backend.storerun("id", "c", run(3, {"k": (3, b"same")}))
+            await backend._roll()
+            c = await backend._conn.execute(
+                "SELECT refs, data FROM blobs ORDER BY data"
+            )
+            assert await c.fetchall() == [(1, b"b"), (2, b"same")]
+
+    asyncio.run(inner())
+
+
+def test_codecs():
+    async def inner():
+        backend = BackendSqlite(":memory:")
+        store = Store(backend, codec_for=[("*.gz", ""), ("*", "zlib")])
+        app = App(store)
+        big = b"hello " * 100
+        async with store:
+            runid = await _run(app, "id", body=big, tiny=b"hi", **{"a.gz": big})
+            stored = await backend.loadrun(runid)
+            assert stored.codecs == {"body": "zlib"}
+            assert stored.data["body"][1] == zlib.compress(big)
+            assert stored.data["a.gz"][1] == big
+
+            run = await store.loadrun(runid)
+            assert {k: v for k, (_, v) in run.data.items()} == {
+                "body": big,
+                "tiny": b"hi",
+                "a.gz": big,
+            }
+
+    asyncio.run(inner())
+
+
+class _Replay:
+    is_new = False
+
+    def loading(self, world: World, key: str, ts: float, data: bytes):
+        return data
+
+
+@mark.parametrize("backend", ["memory", "sqlite"])
+def test_lazy(backend: str, tmp_path: Path):
+    async def inner():
+        b = BackendMemory() if "memory" == backend else BackendSqlite(tmp_path / "db")
+        store = Store(b, codec_for=[("z", "zlib")])
+        app = App(store)
+        big = bytes(range(256)) * 1000
+        async with store:
+            runid = await _run(app, "id", z=big, raw=big, small=b"hi")
+
+            run = await store.loadrunlazy(runid)
+            assert run.sizes["raw"][1] == len(big)
+            assert run.sizes["z"][1] < len(big)
+            assert await store.loaddata(run, "z") == big
+            chunks = [c async for c in store.streamdata(run, "raw", 1000)]
+            assert len(chunks) == 256 and b"".join(chunks) == big
+            assert b"".join([c async for c in store.streamdata(run, "z")]) == big
+
+            # runs stored while one is streamed can be read in the meantime
+            stream = store.streamdata(run, "raw", 1000)
+            first = await anext(stream)
+            other = await _run(app, "id", k=b"other")
+            assert await store.loaddata(await store.loadrunlazy(other), "k") == b"other"
+            rest = [c async for c in stream]
+            assert b"".join([first, *rest]) == big
+
+            # only small keys are fetched (and decoded) before replaying
+            store.replay_prefetch_size = 2
+            async with World(app, "id", _Replay(), runid=runid) as world:
+                assert list(store._prefetched["id", runid]) == ["small"]
+                assert store.load(world, "small") == b"hi"
+                assert store.load(world, "z") == big
+            assert not store._prefetched
+
+    asyncio.run(inner())
+
+
+def test_repeated_keys():
+    async def inner():
+        store = Store(BackendMemory())
+        app = App(store)
+        async with store:
+            async with World(app, "id", None) as world:
+                for n in range(150):
+                    store.store(world, "k", b"%d" % n)
+            run = await store.loadrun(world.runid)
+            assert list(run.data)[:3] == ["k", "k (0)", "k (1)"]
+            assert len(run.data) == 150
+
+            async with World(app, "id", _Replay(), runid=world.runid) as world:
+                assert [store.load(world, "k") for _ in range(150)] == [
+                    b"%d" % n for n in range(150)
+                ]
+                with raises(LookupError):
+                    store.load(world, "k")
+
+    asyncio.run(inner())
+
+
+def test_sqlite_tags():
+    async def inner():
+        backend = BackendSqlite(":memory:", roll_nb_entries=3)
+        async with backend:
+            for ts, tags in enumerate([{"a"}, {"a", "b%"}, {"b%"}, set(), {"A"}]):
+                run = RunInfoFull(ts, "", tags, {})
+                await backend.storerun("id", f"r{ts}", run)
+            await backend._roll()
+            listruns = lambda *tags: backend.listruns(
+                "id", min_ts=0, max_ts=10, any_tag=set(tags)
+            )
+            assert [r.runid for r in await listruns("b%")] == ["r2"]
+            assert [r.runid for r in await listruns("a", "A")] == ["r4"]
+            assert [r.runid for r in await listruns()] == ["r2", "r3", "r4"]
+
+            c = await backend._conn.execute("SELECT runid FROM run_tags ORDER BY 1")
+            assert await c.fetchall() == [("r2",), ("r4",)]
+
+    asyncio.run(inner())
+
+
+def test_sqlite_roll_policies():
+    async def inner():
+        backend = BackendSqlite(
+            ":memory:",
+            roll_old_entries=timedelta(days=1),
+            roll_policies={"keep *": timedelta(days=7)},
+            roll_batch_size=2,
+        )
+        async with backend:
+            now = datetime.now()
+            for id in ("keep me", "drop me"):
+                for days in range(10):
+                    ts = (now - timedelta(days=days, hours=1)).timestamp()
+                    run = RunInfoFull(ts, "", set(), {"k": (ts, b"%d" % days)})
+                    await backend.storerun(id, f"{id} {days}", run)
+            await backend._roll()
+
+            listruns = lambda id: backend.listruns(
+                id, min_ts=0, max_ts=10e10, any_tag=set()
+            )
+            assert len(await listruns("keep me")) == 7
+            assert len(await listruns("drop me")) == 1
+            assert "12 runs rolled" in await backend.status()
+
+    asyncio.run(inner())
+
+
+@mark.parametrize("backend", ["memory", "sqlite"])
+def test_iterruns(backend: str):
+    async def inner():
+        b = BackendMemory() if "memory" == backend else BackendSqlite(":memory:")
+        async with b:
+            # same ts for pairs of runs, so the runid tie breaks
+            for k in range(600):
+                tags = {"odd"} if k % 2 else set()
+                await b.storerun("id", f"r{k:03}", RunInfoFull(k // 2, "", tags, {}))
+            iterruns = lambda **ka: b.iterruns(
+                "id", min_ts=0, max_ts=10e10, any_tag=set(), **ka
+            )
+
+            all = [run.runid async for run in iterruns()]
+            assert all == [f"r{k:03}" for k in range(600)]
+
+            page = [run async for run in iterruns(limit=3, after=(1, "r002"))]
+            assert [run.runid for run in page] == ["r003", "r004", "r005"]
+            last = page[-1].ts, page[-1].runid
+            page = [run.runid async for run in iterruns(limit=2, after=last)]
+            assert page == ["r006", "r007"]
+
+            page = [run.runid async for run in iterruns(descending=True, limit=300)]
+            assert page == [f"r{k:03}" for k in range(599, 299, -1)]
+
+            odd = b.iterruns(
+                "id", min_ts=0, max_ts=10e10, any_tag={"odd"}, after=(298, "r597")
+            )
+            assert [run.runid async for run in odd] == ["r599"]
+
+    asyncio.run(inner())
+
+
+def test_memory_bounded():
+    async def inner():
+        backend = BackendMemory(max_runs=3, max_bytes=10)
+        async with backend:
+            for k in range(4):
+                run = RunInfoFull(
+                    k, "", {"t"}, {"k": (k, b"same"), "l": (k, b"%d" % k)}
+                )
+                await backend.storerun("id", f"r{k}", run)
+            # least recently used goes first
+            await backend.loadrun("r1")
+            await backend.storerun("id", "r4", RunInfoFull(4, "", set(), {}))
+            assert [
+                r.runid
+                for r in await backend.listruns(
+                    "id", min_ts=0, max_ts=10, any_tag=set()
+                )
+            ] == ["r1", "r3", "r4"]
+            assert set(backend._blobs.values()) == {b"same", b"1", b"3"}
+
+            # too many bytes now
+            big = RunInfoFull(5, "", set(), {"k": (5, b"0123456")})
+            await backend.storerun("id", "r5", big)
+            assert list(backend._runs) == ["r4", "r5"]
+            assert [
+                r.runid
+                for r in await backend.listruns(
+                    "id", min_ts=0, max_ts=10, any_tag={"t"}
+                )
+            ] == []
+            with raises(LookupError):
+                await backend.loadrun("r1")
+            assert "evicted" in await backend.status()
+
+    asyncio.run(inner())
+
+
+def test_segments(tmp_path: Path):
+    async def inner():
+        backend = BackendSegments(tmp_path, segment_size=1000, fsync=False)
+        store = Store(backend, codec_for=[("z", "zlib")])
+        app = App(store)
+        big = bytes(range(256)) * 10
+        async with store:
+            runid = await _run(app, "id", z=big, raw=big)
+            run = await store.loadrun(runid)
+            assert {k: v for k, (_, v) in run.data.items()} == {"z": big, "raw": big}
+            lazy = await store.loadrunlazy(runid)
+            assert b"".join([c async for c in store.streamdata(lazy, "z", 7)]) == big
+            for k in range(4):
+                await backend.storerun("id", f"r{k}", RunInfoFull(k, "", {"t"}, {}))
+        assert sorted(p.name for p in tmp_path.glob("*.seg")) == [
+            "00000000.seg",
+            "00000001.seg",
+        ]
+
+        # crashed after writing the last record but before its index line,
+        # and in the middle of writing yet another one
+        idx = tmp_path / "00000001.idx"
+        idx.write_bytes(idx.read_bytes().splitlines(True)[0])
+        with (tmp_path / "00000001.seg").open("ab") as f:
+            f.write(b"girl\0\0")
+
+        backend = BackendSegments(tmp_path)
+        async with backend:
+            listruns = lambda **ka: backend.listruns(
+                "id", min_ts=0, max_ts=10, any_tag=set(), **ka
+            )
+            assert [r.runid for r in await listruns()][-4:] == ["r0", "r1", "r2", "r3"]
+            assert len(idx.read_bytes().splitlines()) == 4
+            assert (await backend.loadrun(runid)).codecs == {"z": "zlib"}
+
+            # the whole first segment goes
+            backend.roll_nb_segments = 1
+            await backend._roll()
+            assert [r.runid for r in await listruns()] == ["r0", "r1", "r2", "r3"]
+            with raises(LookupError):
+                await backend.loadrun(runid)
+            assert not (tmp_path / "00000000.seg").exists()
+
+    asyncio.run(inner())
+
+
+def test_sqlite_readers(tmp_path: Path):
+    async def inner():
+        backend = BackendSqlite(
+            tmp_path / "db", readers=2, synchronous="normal", cache_size=-1000
+        )
+        async with backend:
+            await backend.storerun("id", "a", RunInfoFull(0, "", set(), {}))
+            c = await backend._conn.execute("PRAGMA journal_mode")
+            assert await c.fetchone() == ("wal",)
+
+            # an ongoing write neither blocks the readers nor is seen by them
+            await backend._conn.execute("BEGIN IMMEDIATE")
+            await backend._conn.execute("DELETE FROM event_runs")
+            all = await asyncio.gather(
+                *(
+                    backend.listruns("id", min_ts=0, max_ts=1, any_tag=set())
+                    for _ in range(5)
+                )
+            )
+            assert all == [[RunInfoPartial(0, "a", set())]] * 5
+            await backend._conn.rollback()
+
+        with raises(ValueError):
+            BackendSqlite(":memory:", synchronous="sometimes")
+
+    asyncio.run(inner())
+
+
+def test_sqlite_partitioned(tmp_path: Path):
+    async def inner():
+        backend = BackendSqlitePartitioned(tmp_path, window=timedelta(seconds=10))
+        async with backend:
+            for ts in range(0, 40, 3):
+                tags = {"three"} if ts % 9 else {"nine"}
+                run = RunInfoFull(ts, "", tags, {"k": (ts, b"%d" % ts)})
+                await backend.storerun("id", f"r{ts:02}", run)
+            assert len(list(tmp_path.glob("1970*.sqlite"))) == 4
+            assert (await backend.loadrun("r21")).data == {"k": (21, b"21")}
+            assert await backend.knowntags() == {"three", "nine"}
+
+        async with backend:
+            listruns = lambda min_ts, max_ts: backend.listruns(
+                "id", min_ts=min_ts, max_ts=max_ts, any_tag=set()
+            )
+            assert [r.runid for r in await listruns(12, 18)] == ["r12", "r15", "r18"]
+            assert list(backend._parts) == [10]
+            assert [r.runid for r in await listruns(8, 22)] == [
+                "r09",
+                "r12",
+                "r15",
+                "r18",
+                "r21",
+            ]
+
+            desc = backend.iterruns(
+                "id",
+                min_ts=0,
+                max_ts=100,
+                any_tag={"nine"},
+                after=(27, "r27"),
+                limit=2,
+                descending=True,
+            )
+            assert [r.runid async for r in desc] == ["r18", "r09"]
+
+            # only the last used stay open, older windows without readers
+            backend.max_open = 1
+            assert len(await listruns(0, 100)) == 14
+            assert list(backend._parts) == [30] and not backend._using
+            assert 0 == backend._parts[30].readers
+
+            # not while a lazy run from it is around, nor rolled
+            lazy = await backend.loadrunlazy("r03")
+            assert len(await listruns(0, 100)) == 14
+            assert list(backend._parts) == [0]
+            assert await lazy.reader.aread("k") == b"3"
+            backend.roll_partitions = 3
+            await backend._roll()
+            assert backend._starts == [0, 10, 20, 30]
+            del lazy
+            await asyncio.sleep(0)
+            assert len(await listruns(30, 100)) == 4
+            assert list(backend._parts) == [30]
+
+            backend.roll_partitions = 2
+            await backend._roll()
+            assert [r.runid for r in await listruns(0, 100)][:2] == ["r21", "r24"]
+            with raises(LookupError):
+                await backend.loadrun("r18")
+            assert len(list(tmp_path.glob("1970*.sqlite"))) == 2
+
+    asyncio.run(inner())
+
+
+def test_loadrun_cache():
+    async def inner():
+        backend = BackendMemory(max_runs=2)
+        store = Store(backend, cache_size=10, codec_for=[("*", "zlib")])
+        store.codec_min_size = 0
+        app = App(store)
+        async with store:
+            a = await _run(app, "id", k=b"aaaa")
+            assert (await store.loadrun(a)).data["k"][1] == b"aaaa"
+            assert (await store.loadrun(a)).data["k"][1] == b"aaaa"
+            assert (store.cache_hits, store.cache_misses) == (1, 1)
+
+            # too big to be cached, and pushes nothing out
+            big = await _run(app, "id", k=b"b" * 11)
+            await store.loadrun(big)
+            assert list(store._cache) == [a]
+
+            # retention removing the run also removes it from the cache
+            await _run(app, "id")
+            assert list(store._cache) == []
+            with raises(LookupError):
+                await store.loadrun(a)
+
+    asyncio.run(inner())
+
+
+def test_metrics(caplog: ...):
+    async def inner():
+        backend = BackendSqlite(":memory:", slow_query=0)
+        store = Store(backend)
+        app = App(store)
+        async with store:
+            await _run(app, "id", a=b"a" * 10, b=b"b" * 20)
+            await _run(app, "other")
+            await store.listruns("id", min_ts=0, max_ts=10e10, any_tag=set())
+            it = store.iterruns("id", min_ts=0, max_ts=10e10, any_tag=set())
+            assert 1 == len([run async for run in it])
+            metrics = await procs.lsmetrics(app=app)
+
+        assert metrics["ops"]["storerun"]["count"] == 2
+        assert metrics["ops"]["listruns"]["count"] == 1
+        assert metrics["ops"]["iterruns"]["count"] == 1
+        assert metrics["written"]["handlers"] == {
+            "id": {"runs": 1, "bytes": 30},
+            "other": {"runs": 1, "bytes": 0},
+        }
+        assert metrics["written"]["runs"]["buckets"] == {"1": 1, "64": 1}
+        assert metrics["ongoing"]["runs"] == 0
+        assert 0 < metrics["backend"]["slow_queries"]
+        assert "slow query" in caplog.text and "s): COMMIT" in caplog.text
+
+    asyncio.run(inner())
+
+
+def test_spill(tmp_path: Path):
+    async def inner():
+        backend = BackendMemory()
+        store = Store(backend, spill_dir=tmp_path, spill_size=10)
+        app = App(store)
+        async with store:
+            async with World(app, "id", None) as world:
+                store.store(world, "k", b"small")
+                assert not list(tmp_path.iterdir())
+                store.store(world, "k", b"big enough")
+                store.tagrun(world, "t")
+                store.store(world, "k", b"more")
+                run = store._ongoing["id", world.runid]
+                assert isinstance(run, RunInfoFull) and not run.data
+                assert list(tmp_path.iterdir()) == [tmp_path / f"{world.runid}.spill"]
+            run = await backend.loadrun(world.runid)
+            assert {k: v for k, (_, v) in run.data.items()} == {
+                "k": b"small",
+                "k (0)": b"big enough",
+                "k (1)": b"more",
+            }
+            assert run.tags == {"t"}
+            assert not list(tmp_path.iterdir())
+
+            # as if it crashed in the middle of the run
+            world = World(app, "id", None)
+            await store.beginrun(world)
+            store.store(world, "k", b"even bigger")
+            store._journals["id", world.runid].close()
+            with (tmp_path / f"{world.runid}.spill").open("ab") as f:
+                f.write(b"d\0\0")
+
+        async with store:
+            run = await backend.loadrun(world.runid)
+            assert run.data["k"][1] == b"even bigger"
+            assert run.tags == {"recovered"}
+            assert not list(tmp_path.iterdir())
+
+            # as if it crashed after storing the run but before the unlink
+            world = World(app, "id", None)
+            await store.beginrun(world)
+            store.store(world, "k", b"even bigger")
+            store._journals["id", world.runid].close()
+            spill = tmp_path / f"{world.runid}.spill"
+            kept = spill.read_bytes()
+            await store.finishrun(world)
+            spill.write_bytes(kept)
+
+        async with store:
+            assert (await backend.loadrun(world.runid)).tags == set()
+            assert not list(tmp_path.iterdir())
+
+    asyncio.run(inner())
+
+
+@mark.parametrize("backend", ["memory", "sqlite", "segments"])
+def test_rollups(backend: str, tmp_path: Path):
+    async def inner():
+        b = {
+            "memory": lambda: BackendMemory(),
+            "sqlite": lambda: BackendSqlite(tmp_path / "db"),
+            "segments": lambda: BackendSegments(tmp_path),
+        }[backend]()
+        async with b:
+            for k in range(5):
+                tags = {"odd"} if k % 2 else set()
+                run = RunInfoFull(
+                    k * 1000, "", tags, {"k": (0, b"a" * k), "l": (0, b"")}
+                )
+                await b.storerun("id", f"r{k}", run)
+            rollups = await b.rollups("id", min_ts=3000, max_ts=10e10)
+            # buckets [0, 3600) and [3600, 7200)
+            assert [(r.ts, r.runs, r.bytes, r.keys, r.tags) for r in rollups] == [
+                (0, 4, 6, 8, {"odd": 2}),
+                (3600, 1, 4, 2, {}),
+            ]
+
+            if "sqlite" == backend:
+                # old enough that they are compacted, and again to expire
+                b.rollup_compact_after = timedelta(0)
+                await b._roll_rollups()
+                (day,) = await b.rollups("id", min_ts=0, max_ts=10e10)
+                assert (day.width, day.runs, day.bytes, day.tags) == (
+                    86400,
+                    5,
+                    10,
+                    {"odd": 2},
+                )
+                b.rollup_expire = timedelta(0)
+                await b._roll_rollups()
+                assert await b.rollups("id", min_ts=0, max_ts=10e10) == []
+            if "memory" == backend:
+                assert isinstance(b, BackendMemory)
+                b.rollup_expire = timedelta(0)
+                assert await b.rollups("id", min_ts=0, max_ts=10e10) == []
+
+        if "segments" == backend:
+            # from the index lines when opening, even ones without the sizes
+            idx = tmp_path / "00000000.idx"
+            lines = idx.read_bytes().splitlines(True)
+            old = json.dumps(json.loads(lines[0])[:7]).encode() + b"\n"
+            idx.write_bytes(old + b"".join(lines[1:]))
+            async with b:
+                rollups = await b.rollups("id", min_ts=3000, max_ts=10e10)
+                assert [(r.ts, r.runs, r.bytes, r.keys) for r in rollups] == [
+                    (0, 4, 6, 8),
+                    (3600, 1, 4, 2),
+                ]
+            assert idx.read_bytes() == b"".join(lines)
+
+    asyncio.run(inner())
+
+
+@mark.parametrize("backend", ["memory", "sqlite", "segments"])
+def test_run_outcome(backend: str, tmp_path: Path):
+    async def inner():
+        store = Store(
+            {
+                "memory": lambda: BackendMemory(),
+                "sqlite": lambda: BackendSqlite(tmp_path / "db"),
+                "segments": lambda: BackendSegments(tmp_path),
+            }[backend]()
+        )
+        app = App(store)
+        async with store:
+            ok = await _run(app, "id", k=b"")
+            with raises(KeyError):
+                async with World(app, "id", None) as world:
+                    with store.tracking(world, "op"):
+                        await asyncio.sleep(0.01)
+                    raise KeyError
+            failed = world.runid
+
+            run = await store.loadrunlazy(failed)
+            assert (run.outcome, run.failed) == ("KeyError", True)
+            assert run.duration and 0.01 <= run.timings["op"] <= run.duration
+            assert "flush" in run.timings
+
+            all = await store.listruns("id", min_ts=0, max_ts=10e10, any_tag=set())
+            assert [(r.runid, r.outcome) for r in all] == [
+                (ok, "ok"),
+                (failed, "KeyError"),
+            ]
+            (only,) = await store.listruns(
+                "id", min_ts=0, max_ts=10e10, any_tag=set(), failed_only=True
+            )
+            assert only.runid == failed
+            (only,) = await store.listruns(
+                "id", min_ts=0, max_ts=10e10, any_tag=set(), min_duration=0.01
+            )
+            assert only.runid == failed
+
+    asyncio.run(inner())
+
+
+def test_export_import(tmp_path: Path):
+    async def inner():
+        src = Store(BackendMemory(), codec_for=[("*", "zlib")])
+        app = App(src)
+        big = b"hello " * 100
+        async with src:
+            runids = [await _run(app, "id", k=big, n=bytes([k])) for k in range(5)]
+            other = await _run(app, "other", k=b"")
+            path = tmp_path / "runs.arc"
+            # (small chunks so runs are across several of them)
+            assert 5 == await src.exportruns(
+                path, ["id"], min_ts=0, max_ts=10e10, any_tag=set(), chunk_size=16
+            )
+
+        backend = BackendSqlite(tmp_path / "db")
+        dst = Store(backend)
+        async with dst:
+            assert 5 == await dst.importruns(path, batch_runs=2)
+            assert 0 == await dst.importruns(path)
+            all = await dst.listruns("id", min_ts=0, max_ts=10e10, any_tag=set())
+            assert [r.runid for r in all] == runids
+            assert all[0].outcome == "ok"
+            stored = await backend.loadrun(runids[1])
+            assert stored.codecs == {"k": "zlib"}
+            run = await dst.loadrun(runids[1])
+            assert {k: v for k, (_, v) in run.data.items()} == {
+                "k": big,
+                "n": b"\1",
+            }
+            with raises(LookupError):
+                await dst.loadrun(other)
+
+            path.write_bytes(path.read_bytes()[:-3])
+            with raises(ValueError):
+                await dst.importruns(path)
+
+    asyncio.run(inner())
+
+
+def test_sqlite_search(tmp_path: Path):
+    async def inner():
+        backend = BackendSqlite(tmp_path / "db", search_index=True, search_max_size=100)
+        store = Store(backend, codec_for=[("*.z", "zlib")], codec_min_size=0)
+        app = App(store)
+        async with store:
+            old = await _run(app, "id", body=b'{"order": "ORD-1234"}')
+            zipped = await _run(app, "id", **{"a.z": b"see ORD-1234 here"})
+            await _run(app, "id", body=b"ORD-1234 " * 20, bin=b"\0ORD-1234")
+            await _run(app, "other", body=b"ORD-1234")
+            assert (await backend.loadrun(zipped)).codecs == {"a.z": "zlib"}
+            while backend._indexed < 4:
+                await asyncio.sleep(0.01)
+
+            hits = await store.search("ord-1234", ids=["id"])
+            assert {(h.runid, h.key) for h in hits} == {(old, "body"), (zipped, "a.z")}
+            (hit,) = await store.search("see ORD-1234", ids=["id"])
+            assert hit.snippet == "[see] [ORD-1234] here"
+
+            # rolling removes them from the index as well
+            backend.roll_nb_entries = 1
+            await backend._roll()
+            assert await store.search("ORD-1234", ids=["id"]) == []
+
+        with raises(NotImplementedError):
+            await Store(BackendMemory()).search("ORD-1234")
+        store = Store(BackendSqlite(":memory:"))
+        async with store:
+            with raises(NotImplementedError):
+                await store.search("ORD-1234")
+            r = await procs.search("ORD-1234", app=App(store))
+            assert r == {
+                "error": "search not enabled: no full-text index, see `search_index`"
+            }
+
+    asyncio.run(inner())
+
+
+def test_sqlite_sidecars(tmp_path: Path):
+    async def inner():
+        sidecars = tmp_path / "sidecars"
+        backend = BackendSqlite(
+            tmp_path / "db", sidecar_dir=sidecars, sidecar_min_size=100
+        )
+        store = Store(backend)
+        app = App(store)
+        big = bytes(range(256))
+        async with store:
+            first = await _run(app, "id", big=big, small=b"small")
+            second = await _run(app, "id", big=big)
+            (file,) = sidecars.glob("*/*")
+            assert file.read_bytes() == big
+            all = await backend._fetchall(backend._conn, "SELECT data FROM blobs")
+            assert sorted(data for data, in all) == [b"", b"small"]
+
+            run = await store.loadrun(first)
+            assert {k: v for k, (_, v) in run.data.items()} == {
+                "big": big,
+                "small": b"small",
+            }
+            # the run's own ts, not the one of its (last) key
+            data = {"small": (1.0, b"small"), "big": (2.0, big)}
+            await backend.storerun("id", "ts", RunInfoFull(2000.0, "ts", set(), data))
+            run = await backend.loadrun("ts")
+            assert run.ts == 2000.0 and run.data == data
+
+            lazy = await store.loadrunlazy(second)
+            assert lazy.sizes["big"][1] == 256 and lazy.reader.path("big") == file
+            assert b"".join(lazy.reader.chunks("big", 100)) == big
+
+            # an orphan (as if it crashed before the commit), old enough
+            orphan = sidecars / "ab" / ("ab" * 32)
+            orphan.parent.mkdir()
+            orphan.write_bytes(b"orphan")
+            os.utime(orphan, (0, 0))
+            # and temporary ones (as if it crashed while writing them)
+            tmp = orphan.with_name(f"{orphan.name}.1.2.tmp")
+            tmp.write_bytes(b"orph")
+            recent = orphan.with_name(f"{orphan.name}.3.4.tmp")
+            recent.write_bytes(b"orph")
+            os.utime(tmp, (0, 0))
+            backend.roll_nb_entries = 1
+            await backend._roll()
+            assert not orphan.exists() and file.exists()
+            assert not tmp.exists() and recent.exists()
+            await backend._roll_until(r"ts <= ?", (10e10,))
+            assert not file.exists()
+
+    asyncio.run(inner())
@@ -0,0 +1,141 @@
+import asyncio
+import json
+from time import time
+
+from aiohttp import web
+from pytest import raises
+
+from girl import App
+from girl import World
+from girl import runids
+from girl.store import BackendMemory
+from girl.store import Store
+
+
+def test_web_pool():
+    async def inner():
+        peers = set[object]()
+
+        async def hi(req: web.Request):
+            peers.add(req.transport and req.transport.get_extra_info("peername"))
+            return web.Response(body=b"hi")
+
+        server = web.Application()
+        server.router.add_route("*", "/hi", hi)
+        runner = web.AppRunner(server)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        (url,) = (f"http://127.0.0.1:{port}/hi" for *_, port in runner.addresses)
+
+        store = Store(BackendMemory())
+        app = App(store, {"world_web_pool": {"limit_per_host": 1}})
+        try:
+            async with store:
+                await app.warmup(url)
+                for _ in range(3):
+                    async with World(app, "id", None) as world:
+                        assert await world.web.request_bytes("GET", url) == b"hi"
+                    assert world.web._inner and world.web._inner.closed
+                run = await store.loadrun(world.runid)
+                assert run.data[f"GET {url}"][1] == b"hi"
+            # one connection for the warm up and every run after
+            assert 1 == len(peers)
+
+            # a world on a loop of its own (eg. `procs.doevent`) cannot use
+            # the shared pool, it gets a private one
+            async def elsewhere():
+                async with World(app, "id", None) as world:
+                    assert await world.web.request_bytes("GET", url) == b"hi"
+                    assert world.web._inner
+                    assert world.web._inner.connector not in {
+                        conn for _, conn in app._connectors.values()
+                    }
+                assert world.web._inner.closed
+
+            async with store:
+                await asyncio.to_thread(asyncio.run, elsewhere())
+            assert 2 == len(peers)
+        finally:
+            for _, conn in app._connectors.values():
+                await conn.close()
+            await runner.cleanup()
+
+    asyncio.run(inner())
+
+
+def test_runids():
+    many = [runids.ulid() for _ in range(10_000)]
+    assert many == sorted(many) and len(set(many)) == len(many)
+    assert all(26 == len(it) for it in many)
+    ts = runids.timestamp(many[0])
+    assert ts and abs(time() - ts) < 5
+    assert runids.timestamp("some-banana") is None
+    assert runids.alias(many[0]) == runids.alias(many[0]) != runids.alias(many[1])
+
+    app = App(Store(BackendMemory()))
+    assert runids.timestamp(World(app, "id", None).runid)
+    app.settings["runid"] = lambda: "fixed"
+    assert "fixed" == World(app, "id", None).runid
+
+
+class _Replay:
+    is_new = False
+
+    def loading(self, world: World, key: str, ts: float, data: bytes):
+        return data
+
+
+def test_request_stream():
+    async def inner():
+        async def big(req: web.Request):
+            res = web.StreamResponse()
+            await res.prepare(req)
+            for k in range(4):
+                await res.write(bytes([k]) * 1000)
+            await res.write_eof()
+            return res
+
+        server = web.Application()
+        server.router.add_route("*", "/big", big)
+        runner = web.AppRunner(server)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        (url,) = (f"http://127.0.0.1:{port}/big" for *_, port in runner.addresses)
+
+        store = Store(BackendMemory())
+        app = App(store)
+        try:
+            async with store:
+                async with World(app, "id", None) as world:
+                    got = [
+                        chunk
+                        async for chunk in world.web.request_stream(
+                            "GET", url, chunk_size=1500
+                        )
+                    ]
+                assert b"".join(got) == b"".join(bytes([k]) * 1000 for k in range(4))
+                async with World(app, "id", _Replay(), runid=world.runid) as again:
+                    replayed = [
+                        chunk async for chunk in again.web.request_stream("GET", url)
+                    ]
+                assert replayed == got
+
+                async with World(app, "id", None) as world:
+                    async for _ in world.web.request_stream("GET", url, max_record=0):
+                        pass
+                run = await store.loadrun(world.runid)
+                assert not any("*chunk*" in key for key in run.data)
+                end = json.loads(run.data[f"GET {url} *stream*"][1])
+                assert (end["size"], end["recorded"]) == (4000, 0)
+                async with World(app, "id", _Replay(), runid=world.runid) as again:
+                    with raises(LookupError):
+                        async for _ in again.web.request_stream("GET", url):
+                            pass
+        finally:
+            for _, conn in app._connectors.values():
+                await conn.close()
+            await runner.cleanup()
+
+    asyncio.run(inner())